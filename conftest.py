@@ -1,3 +1,14 @@
+import contextlib
+
 import pytest
 
+# pytester restores sys.modules after each test, the c extension of pyyaml cannot be imported twice.
+with contextlib.suppress(ImportError):
+    import yaml
+
+# the worker processes pickle functions and call items by module, the modules must stay the same objects.
+import concurrent.futures.process
+
+import qpub.configure
+
 pytest_plugins = ["pytester"]
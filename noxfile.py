@@ -103,6 +103,12 @@ def docs(session):
     session.run(*"python -m qpub docs --qpub .".split(), *session.posargs)
 
 
+@nox.session(python=False)
+def benchmark(session):
+    """time the hot paths of qpub against the implementations they replaced."""
+    session.run(*"python src/benchmark_qpub.py".split(), *session.posargs)
+
+
 @nox.session(reuse_venv=True)
 def uml(session):
     """export a visual representation of the project."""
@@ -0,0 +1,270 @@
+"""benchmarks for the hot paths in qpub.
+
+run them with `nox -s benchmark` or `python src/benchmark_qpub.py`.
+each benchmark prints the timing of the current implementation next to the approach it replaced.
+"""
+import time
+import timeit
+import warnings
+
+
+def paths(n=20000):
+    """a synthetic inventory that looks like a large python monorepo."""
+    return (
+        [f"pkg{i % 50}/sub{i % 7}/module_{i}.py" for i in range(n)]
+        + [f"pkg{i % 50}/__pycache__/module_{i}.cpython-37.pyc" for i in range(n // 10)]
+        + [f"docs/_build/html/page_{i}.html" for i in range(n // 100)]
+    )
+
+
+def benchmark_ignored_by(number=3):
+    """compare the compiled ignore matcher with a linear scan over the patterns."""
+    import qpub
+
+    def loop(object):
+        for k, v in qpub.ignore().items():
+            try:
+                next(v.match([str(object)]))
+                return k
+            except StopIteration:
+                continue
+
+    objects = paths()
+    assert list(map(loop, objects)) == list(map(qpub.ignored_by, objects))
+    return dict(
+        loop=timeit.timeit(lambda: list(map(loop, objects)), number=number),
+        compiled=timeit.timeit(
+            lambda: list(map(qpub.ignored_by, objects)), number=number
+        ),
+    )
+
+
+def benchmark_walk(number=1, latency=0.002, jobs=8):
+    """compare the sequential and threaded walks when every listing pays a network round trip."""
+    import tempfile
+
+    import qpub.base
+
+    scandir = qpub.base.scandir
+
+    def slow(*args):
+        time.sleep(latency)
+        return scandir(*args)
+
+    with tempfile.TemporaryDirectory() as dir:
+        for object in paths(2000):
+            qpub.Path(dir, object).parent.mkdir(parents=True, exist_ok=True)
+            qpub.Path(dir, object).touch()
+        qpub.base.scandir = slow
+        try:
+            assert sorted(qpub.walk(dir)) == sorted(qpub.walk(dir, jobs=jobs))
+            return dict(
+                sequential=timeit.timeit(lambda: list(qpub.walk(dir)), number=number),
+                threaded=timeit.timeit(
+                    lambda: list(qpub.walk(dir, jobs=jobs)), number=number
+                ),
+            )
+        finally:
+            qpub.base.scandir = scandir
+
+
+def modules(n=400):
+    """synthetic modules with enough imports and code to make depfinder work."""
+    body = "".join(
+        f"def f{i}(x):\n    return [y ** {i} for y in range(x) if y % 3]\n\n"
+        for i in range(50)
+    )
+    return [
+        (
+            ".py",
+            f"import os\nimport numpy\nfrom pkg{i % 50} import sub\n{body}".encode(),
+        )
+        for i in range(n)
+    ]
+
+
+def benchmark_iter_imports(number=1):
+    """compare inferring the imports of the files in one process with the process pool across the cores.
+
+    every run starts with an empty import cache."""
+    import os
+    import tempfile
+
+    import qpub
+    from qpub import configure
+
+    jobs = max(os.cpu_count() or 1, 2)
+    with tempfile.TemporaryDirectory() as dir:
+        files = []
+        for i, (suffix, data) in enumerate(modules()):
+            files.append(qpub.Path(dir, f"module_{i}{suffix}"))
+            files[-1].write_bytes(data)
+        previous = qpub.options.cache
+
+        def gather(jobs):
+            with tempfile.TemporaryDirectory() as cache:
+                qpub.options.cache = qpub.Path(cache)
+                return configure.gather_imports(files, jobs)
+
+        try:
+            assert gather(1) == gather(jobs)
+            return dict(
+                serial=timeit.timeit(lambda: gather(1), number=number),
+                pool=timeit.timeit(lambda: gather(jobs), number=number),
+                jobs=jobs,
+            )
+        finally:
+            qpub.options.cache = previous
+
+
+def benchmark_scan_imports(number=1):
+    """compare the ast scanner with depfinder on the modules in the standard library.
+
+    the difference counts the files where the required and questionable imports disagree."""
+    import sysconfig
+
+    import qpub
+    from qpub import configure
+
+    depfinder = configure._import_depfinder()
+    sources = []
+    for file in sorted(qpub.Path(sysconfig.get_paths()["stdlib"]).glob("*.py")):
+        try:
+            sources.append(file.read_text())
+        except UnicodeDecodeError:
+            continue
+
+    def describe(source):
+        try:
+            return depfinder.main.get_imported_libs(source).describe()
+        except SyntaxError:
+            return {}
+
+    def scan(source):
+        try:
+            return configure.scan_imports(source)
+        except SyntaxError:
+            return {}
+
+    def key(object):
+        return object.get("required", set()), object.get("questionable", set())
+
+    difference = sum(key(describe(x)) != key(scan(x)) for x in sources)
+    return dict(
+        depfinder=timeit.timeit(lambda: list(map(describe, sources)), number=number),
+        ast=timeit.timeit(lambda: list(map(scan, sources)), number=number),
+        files=len(sources),
+        difference=difference,
+    )
+
+
+def notebook(cells=200, size=2**16):
+    """a notebook whose code cells carry large base64 image outputs."""
+    import base64
+    import os
+
+    import nbformat
+
+    object = nbformat.v4.new_notebook()
+    for i in range(cells):
+        cell = nbformat.v4.new_code_cell(f"import pkg{i}\nplot({i})")
+        cell.outputs = [
+            nbformat.v4.new_output(
+                "display_data",
+                data={"image/png": base64.b64encode(os.urandom(size)).decode()},
+            )
+        ]
+        object.cells.append(cell)
+    return nbformat.writes(object).encode()
+
+
+def benchmark_rough_source(number=3):
+    """compare decoding the whole notebook with scanning the text for the code cells."""
+    import json
+    import tracemalloc
+
+    from qpub import configure
+
+    data = notebook()
+
+    def loads():
+        return configure.rough_source(json.loads(data))
+
+    def peak(callable):
+        tracemalloc.start()
+        callable()
+        object = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return object
+
+    assert loads() == configure.rough_source(data)
+    return dict(
+        megabytes=len(data) / 2**20,
+        loads=timeit.timeit(loads, number=number),
+        scan=timeit.timeit(lambda: configure.rough_source(data), number=number),
+        loads_peak=peak(loads) / 2**20,
+        scan_peak=peak(lambda: configure.rough_source(data)) / 2**20,
+    )
+
+
+def payloads(n=3000):
+    """depfinder payloads as they come out of json, with thousands of distinct names."""
+    import random
+
+    random.seed(0)
+    names = [f"pkg{i}" for i in range(n)]
+    return [
+        dict(
+            required=random.sample(names, 8),
+            questionable=random.sample(names, 2),
+            builtin=["os", "sys", f"mod{i % 200}"],
+        )
+        for i in range(n)
+    ]
+
+
+def benchmark_merge(number=1):
+    """compare the hash indexed merge of all the payloads at once with pairwise membership tests."""
+    import copy
+    import functools
+
+    import qpub
+
+    def loop(*args):
+        a, b, *args = args
+        if args:
+            b = functools.reduce(loop, (b, *args))
+        if hasattr(a, "items"):
+            for k, v in a.items():
+                if k in b:
+                    a[k] = loop(v, b[k])
+            for k, v in b.items():
+                if k not in a:
+                    a[k] = v
+            return a
+        if isinstance(a, list):
+            return a + list(x for x in b if x not in a)
+        return a or b
+
+    objects = payloads()
+
+    def reduce(callable):
+        return callable({}, *copy.deepcopy(objects))
+
+    assert reduce(loop) == reduce(qpub.merge)
+    return dict(
+        loop=timeit.timeit(lambda: reduce(loop), number=number),
+        hashed=timeit.timeit(lambda: reduce(qpub.merge), number=number),
+        payloads=len(objects),
+    )
+
+
+def main():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    for name, object in list(globals().items()):
+        if name.startswith("benchmark_"):
+            print(name, object())
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,13 @@ from .base import *
 from .files import *
 
 
+async def gather_imports_async(files, jobs=None, progress=None):
+    """infer the imports of files without blocking the running event loop."""
+    from .configure import gather_imports_async
+
+    return await gather_imports_async(files, jobs, progress)
+
+
 def load_ipython_extension(shell):
     import doit
 
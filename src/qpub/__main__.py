@@ -39,13 +39,9 @@ def load_tasks(a="all"):
 
         object.update(vars(lint))
 
-    import doit
+    from . import get_reporter
 
-    class Reporter(doit.reporter.ConsoleReporter):
-        def execute_task(self, task):
-            self.outstream.write("MyReporter --> %s\n" % task.title())
-
-    DOIT_CONFIG["reporter"] = Reporter
+    DOIT_CONFIG["reporter"] = get_reporter()
 
     return {
         **{k: v for k, v in object.items() if k.startswith("task_")},
@@ -60,6 +56,11 @@ def main():
 
     if not args:
         args = ["list"]
+    if args == ["watch"]:
+        from .watch import watch
+
+        # only the configuration tasks rerun, building and installing stay explicit.
+        return watch(load_tasks("configure"))
     main(load_tasks(ns.actions), argv=args, raises=True)
 
 
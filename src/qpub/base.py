@@ -3,21 +3,75 @@
 import collections
 import dataclasses
 import fnmatch
+import functools
 import importlib
+import inspect
 import io
+import json
+import os
 import re
 import sys
 
 from . import DOIT_CONFIG
-from .files import CONVENTIONS, GIT, SRC, File, Path, DOCS, File
+from .files import CONVENTIONS, GIT, GITIGNORE, SRC, File, Path, DOCS, File, transaction
 
 BUILDSYSTEM = "build-system"
 
 
 class options:
-    cache = Path(__file__).parent / "_data"
+    # the inventories and import payloads are kept with the project, not in site-packages.
+    cache = Path(os.environ.get("QPUB_CACHE", ".qpub"))
+    # list directories with a thread pool, it pays off on network filesystems.
+    walk_jobs = int(os.environ.get("QPUB_WALK_JOBS", 0) or 0)
+    # the worker processes that infer imports, they default to the number of cores.
+    jobs = int(os.environ.get("QPUB_JOBS", 0) or 0) or os.cpu_count() or 1
+    # the import scanner, depfinder or the builtin ast scanner.
+    imports = os.environ.get("QPUB_IMPORTS", "depfinder")
+    # the files that are read at once while inferring imports.
+    open_files = int(os.environ.get("QPUB_OPEN_FILES", 32) or 32)
+    # files larger than max_bytes or with lines longer than max_line are sampled instead of parsed.
+    max_bytes = int(os.environ.get("QPUB_MAX_BYTES", 2**22) or 2**22)
+    max_line = int(os.environ.get("QPUB_MAX_LINE", 2**12) or 2**12)
+    # notebooks are split into code cells on the event loop up to max_notebook bytes, the outputs are skipped.
+    max_notebook = int(os.environ.get("QPUB_MAX_NOTEBOOK", 2**28) or 2**28)
+    # the seconds a worker process parses a file before it samples the imports instead.
+    # with a budget even a single job or a small batch is parsed in a worker process, 0 parses in a thread.
+    file_budget = float(os.environ.get("QPUB_FILE_BUDGET", 10) or 0)
+    # a callable that is told the finished and total files during long tasks.
+    progress = None
 
 
+SNAPSHOT = {}
+
+
+def snapshot(callable):
+    """memoize a project query for the working directory until the snapshot is invalidated.
+
+    the task creators and their actions ask the same questions of the project many times in one run."""
+
+    def key(args, kwargs):
+        return os.getcwd(), callable.__name__, args, tuple(sorted(kwargs.items()))
+
+    @functools.wraps(callable)
+    def main(*args, **kwargs):
+        if key(args, kwargs) not in SNAPSHOT:
+            SNAPSHOT[key(args, kwargs)] = callable(*args, **kwargs)
+        return SNAPSHOT[key(args, kwargs)]
+
+    def seed(value, *args, **kwargs):
+        """store an answer the caller already knows, the query is not run."""
+        SNAPSHOT[key(args, kwargs)] = value
+
+    main.seed = seed
+    return main
+
+
+def invalidate():
+    """forget the project snapshot. tasks with targets invalidate it after their actions."""
+    SNAPSHOT.clear()
+
+
+@snapshot
 def get_repo():
     if GIT.exists():
         import git
@@ -78,6 +132,27 @@ class Task(Dict):
     pos_arg: str = None
     clean: bool = dataclasses.field(default_factory=list)
 
+    def __post_init__(self):
+        if self.targets and self.actions:
+            # the files an action writes are flushed once, unchanged files keep their mtime.
+            self.actions = [transacted(x) for x in self.actions]
+            # the targets may change the inventory, name, or version of the project.
+            self.actions = self.actions + [invalidate]
+        super().__post_init__()
+
+
+def transacted(callable):
+    """run a python action in a write transaction."""
+    if not inspect.isroutine(callable):
+        return callable
+
+    @functools.wraps(callable)
+    def main(*args, **kwargs):
+        with transaction():
+            return callable(*args, **kwargs)
+
+    return main
+
 
 @dataclasses.dataclass
 class Param(Dict):
@@ -138,6 +213,7 @@ def get_name_file():
     return get_name_from_folder() or get_name_from_files()
 
 
+@snapshot
 def get_name(common={File("notebooks"), File("docs"), File("posts"), File("tests")}):
     file = get_name_file()
     m = post_pattern.match(file.stem)
@@ -160,17 +236,20 @@ class Chapter:
     suffixes: list = dataclasses.field(default_factory=list)
     directories: list = dataclasses.field(default_factory=list, repr=False)
     exclude_directories: list = dataclasses.field(default_factory=list, repr=False)
+    entries: dataclasses.InitVar[list] = None
 
-    def __post_init__(self):
+    def __post_init__(self, entries):
         if isinstance(self.dir, str):
             self.dir = Path(self.dir)
-        self.get_include_exclude()
-        self.directories = sorted(set(x.parent for x in self.include))
-        self.include = sorted(set(x for x in self.include if x not in self.directories))
+        self.get_include_exclude(entries=entries)
+        directories = set(x.parent for x in self.include)
+        self.directories = sorted(directories)
+        self.include = sorted(set(x for x in self.include if x not in directories))
+        self.exclude = sorted(self.exclude)
         self.exclude_patterns = sorted(set(self.exclude_patterns))
 
         self.suffixes = sorted(set(x.suffix for x in self.include if x.suffix))
-        self.exclude_directories = sorted(set(x for x in self.exclude if x.is_dir()))
+        self.exclude_directories = sorted(set(self.exclude_directories))
 
     def source_files(self):
         """filter the source files"""
@@ -191,45 +270,203 @@ class Chapter:
             return [x for x in self.include if x.is_relative_to(DOCS)]
         return []
 
-    def get_include_exclude(self, dir=None, files=None):
-        """split the included and excluded files"""
-        dir = dir or self.dir
-        root = files is None
-        files = [] if root else files
-        for x in dir.iterdir():
-            by = ignored_by(str(x))
-            if x.is_dir():
-                by = ignored_by(str(x))
-                if not by:
-                    by = ignored_by(x.relative_to(dir) / ".tmp")
-                if by:
-                    self.exclude_patterns.append(by)
-                    self.exclude.append(x)
-                else:
-                    self.get_include_exclude(x, files)
-
-                continue
-
-            if not by:
-                by = ignored_by(str(x.relative_to(dir)))
-
+    def get_include_exclude(self, dir=None, entries=None):
+        """split the included and excluded files, the entries of a previous walk skip the walk."""
+        inventory = None if entries is not None else Inventory(dir or self.dir)
+        if inventory:
+            entries = walk(dir or self.dir, inventory=inventory, jobs=options.walk_jobs)
+        for x, is_dir, by in entries:
             if by:
                 self.exclude.append(x)
-            else:
+                if is_dir:
+                    self.exclude_patterns.append(by)
+                    self.exclude_directories.append(x)
+            elif not is_dir:
                 self.include.append(x)
+        if inventory:
+            inventory.save()
 
     def dump(self):
         return {
             x: [str(x) for x in getattr(self, x)]
             if isinstance(getattr(self, x), list)
             else str(getattr(self, x))
-            for x in self.__annotations__
+            for x in (x.name for x in dataclasses.fields(self))
         }
 
     def _repr_json_(self):
         return self.dump()
 
 
+def walk(dir=None, ignore=None, inventory=None, jobs=None, start=""):
+    """walk a directory tree with os.scandir.
+
+    yield the path, whether it is a directory, and the pattern that ignores it for every entry.
+    the ignore lookup uses the path relative to the root, directories get a trailing slash.
+    the .gitignore files in the project apply to the entries below their directory.
+    ignored directories are yielded, but they are never entered.
+    an inventory replays the listings of directories that have not changed since the last walk.
+    more than one job lists directories concurrently in a thread pool, the order of the entries then varies.
+    a start directory relative to the root only walks below it, the .gitignore files above it still apply.
+    """
+    dir = Path(dir or Path())
+    ignore = ignore or compiled_ignore()
+    listdir = inventory.listdir if inventory else scandir
+    start = start.strip("/")
+    top = (start and start + "/", gitignore_specs(dir, start))
+
+    def visit(parent, specs):
+        listing = listdir(dir / parent, parent)
+        if (GITIGNORE.name, False) in listing:
+            specs += ((len(parent), gitignore(dir / parent / GITIGNORE)),)
+        entries, children = [], []
+        for name, is_dir in listing:
+            local = parent + name
+            by = ignored_by_specs(local + "/" if is_dir else local, ignore, specs)
+            entries.append((dir / local, is_dir, by))
+            if is_dir and not by:
+                children.append((local + "/", specs))
+        return entries, children
+
+    if jobs and jobs > 1:
+        import concurrent.futures
+
+        with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+            pending = {pool.submit(visit, *top)}
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    entries, children = future.result()
+                    yield from entries
+                    pending.update(pool.submit(visit, *x) for x in children)
+        return
+
+    stack = [top]
+    while stack:
+        entries, children = visit(*stack.pop())
+        yield from entries
+        stack.extend(children)
+
+
+def ignored_by_specs(key, ignore, specs):
+    """the pattern that ignores a key relative to the root, the bundled patterns come first.
+
+    each spec is the offset of its directory in the key and the compiled .gitignore file."""
+    by = ignore.by(key)
+    for start, spec in specs:
+        if by:
+            break
+        by = spec.by(key[start:])
+    return by
+
+
+def gitignore_specs(dir, local):
+    """the compiled .gitignore files of the directories that hold a path relative to the root, outermost first."""
+    specs, parent = (), ""
+    for name in local.split("/") if local else ():
+        file = dir / parent / GITIGNORE
+        if file.is_file():
+            specs += ((len(parent), gitignore(file)),)
+        parent += name + "/"
+    return specs
+
+
+def ignored_in(local, is_dir=False, dir=None, ignore=None):
+    """the pattern that ignores a path relative to the root like walk decides it, with the .gitignore files above it."""
+    dir = Path(dir or Path())
+    local = Path(local).as_posix()
+    return ignored_by_specs(
+        local + "/" if is_dir else local,
+        ignore or compiled_ignore(),
+        gitignore_specs(dir, local),
+    )
+
+
+def gitignore(file, cache={}):
+    """compile the patterns in a .gitignore file.
+
+    the matchers are cached by the path, mtime, and size of the file.
+    like git the last pattern that matches decides, so the patterns are matched in reverse
+    and a negated pattern that matches keeps the path."""
+    import pathspec
+
+    stat = os.stat(file)
+    key = str(file), stat.st_mtime_ns, stat.st_size
+    if key not in cache:
+        patterns = []
+        for pattern in Path(file).read_text().splitlines():
+            match = pathspec.patterns.GitWildMatchPattern(pattern)
+            if match.include is not None:
+                patterns.append((pattern, match))
+        cache[key] = Ignore(patterns[::-1])
+    return cache[key]
+
+
+def scandir(dir, local=None):
+    """list the names in a directory and whether they are directories."""
+    with os.scandir(dir) as entries:
+        return sorted((x.name, x.is_dir()) for x in entries)
+
+
+@dataclasses.dataclass
+class Inventory:
+    """a persistent record of the directory listings in a project.
+
+    each listing is stored with the mtime and inode of its directory.
+    adding, removing, or renaming an entry changes the mtime of the directory,
+    so a listing is only read from disk again when its directory changed."""
+
+    dir: object = dataclasses.field(default_factory=Path)
+    file: object = None
+    directories: dict = dataclasses.field(default_factory=dict, repr=False)
+    visited: dict = dataclasses.field(default_factory=dict, repr=False)
+    changed: bool = False
+
+    def __post_init__(self):
+        import hashlib
+
+        self.dir = Path(self.dir)
+        if self.file is None:
+            key = hashlib.sha1(str(self.dir.absolute()).encode()).hexdigest()
+            self.file = File(options.cache / "inventory" / f"{key}.json")
+        try:
+            self.directories = self.file.load().get("directories", {})
+        except (OSError, ValueError):
+            self.directories = {}
+
+    def listdir(self, dir, local):
+        stat = os.stat(dir)
+        key = [stat.st_mtime_ns, stat.st_ino]
+        cached = self.directories.get(local)
+        if cached and cached[:2] == key:
+            listing = [tuple(x) for x in cached[2]]
+        else:
+            listing = scandir(dir)
+            self.changed = True
+        self.visited[local] = key + [listing]
+        return listing
+
+    def save(self):
+        """write the directories visited in the last walk, skip it when nothing changed."""
+        if not self.changed and self.visited.keys() == self.directories.keys():
+            return
+        self.directories, self.changed = self.visited, False
+        try:
+            self.file.parent.mkdir(parents=True, exist_ok=True)
+            self.file.write_text(json.dumps(dict(directories=self.visited)))
+        except OSError:
+            # the cache is an optimization, a read only location only means we walk again.
+            pass
+
+
+@snapshot
+def get_chapter():
+    """the chapter for the working directory, shared by every task in a run."""
+    return Chapter()
+
+
 def is_private(object, chars=".-"):
     """is the file name hidden or private"""
     return Path(object).stem.startswith(tuple(chars))
@@ -263,6 +500,7 @@ def is_flit(name=None):
     return bool(get_module(name))
 
 
+@snapshot
 def get_version():
     """get the project version"""
     import datetime
@@ -291,6 +529,7 @@ def normalize_version(object):
         return str(packaging.version.Version(object))
 
 
+@snapshot
 def get_description():
     """get the project description"""
     import flit
@@ -343,11 +582,7 @@ def main(object=None, argv=None, raises=False):
     if isinstance(argv, str):
         argv = argv.split()
 
-    class Reporter(doit.reporter.ConsoleReporter):
-        def execute_task(self, task):
-            self.outstream.write("MyReporter --> %s\n" % task.title())
-
-    DOIT_CONFIG["reporter"] = Reporter
+    DOIT_CONFIG["reporter"] = get_reporter()
     main = doit.doit_cmd.DoitMain(doit.cmd_base.ModuleTaskLoader(object))
 
     code = main.run(argv)
@@ -356,6 +591,31 @@ def main(object=None, argv=None, raises=False):
     return code
 
 
+def get_reporter(cache={}):
+    """the doit reporter that names the running task and shows the progress of its actions."""
+    if not cache:
+        import doit
+
+        class Reporter(doit.reporter.ConsoleReporter):
+            def execute_task(self, task):
+                self.outstream.write("MyReporter --> %s\n" % task.title())
+                self.last, options.progress = 0, self.progress
+
+            def progress(self, done, total):
+                """show the files a task finished, at most ten times a second."""
+                import time
+
+                if done == total or time.monotonic() - self.last > 0.1:
+                    self.last = time.monotonic()
+                    self.outstream.write(f"\r    {done}/{total} files")
+                    if done == total:
+                        self.outstream.write("\n")
+                    self.outstream.flush()
+
+        cache[None] = Reporter
+    return cache[None]
+
+
 def needs(*object):
     """a function designed install packages as needed"""
     import doit
@@ -382,11 +642,33 @@ def where_template(template):
     return template
 
 
-def templated_file(template, data):
-    """return the templated data based on a template"""
+def load_template(template, cache={}):
+    """load a template once, every render shares the parsed template."""
+    if template not in cache:
+        cache[template] = where_template(template).load(edit=False)
+    return cache[template]
+
+
+def prewarm_templates(*templates):
+    """load the templates a task renders when the task is defined."""
+    for template in templates:
+        load_template(template)
+
+
+def templated_file(template, data, cache={}):
+    """return the templated data based on a template.
+
+    renders are memoized by the template and a fingerprint of the data, the callers get a copy."""
+    import copy
+    import hashlib
+
     import jsone
 
-    return jsone.render(where_template(template).load(), data)
+    fingerprint = json.dumps(data, sort_keys=True, default=str).encode()
+    key = template, hashlib.sha1(fingerprint).hexdigest()
+    if key not in cache:
+        cache[key] = jsone.render(load_template(template), data)
+    return copy.deepcopy(cache[key])
 
 
 def ignore(cache={}):
@@ -402,7 +684,7 @@ def ignore(cache={}):
         file = where_template(file)
         for pattern in (
             file.read_text().splitlines()
-            + ".local .vscode _build .gitignore .git .doit.db* .benchmarks".split()
+            + ".local .vscode _build .gitignore .git .doit.db* .benchmarks .qpub".split()
         ):
             if bool(pattern):
                 match = pathspec.patterns.GitWildMatchPattern(pattern)
@@ -411,14 +693,80 @@ def ignore(cache={}):
     return cache
 
 
+@dataclasses.dataclass
+class Ignore:
+    """a compiled matcher for a sequence of gitignore patterns.
+
+    plain names (`__pycache__/`) and suffixes (`*.egg-info`) are looked up per path component in dictionaries,
+    the remaining patterns are joined into one regular expression.
+    every route keeps the position of its pattern so the first pattern that matches is the one reported,
+    nothing is reported when that pattern is negated."""
+
+    patterns: list = dataclasses.field(default_factory=list)
+    names: dict = dataclasses.field(default_factory=dict, repr=False)
+    suffixes: dict = dataclasses.field(default_factory=dict, repr=False)
+    regex: object = dataclasses.field(default=None, repr=False)
+
+    def __post_init__(self):
+        if isinstance(self.patterns, dict):
+            self.patterns = list(self.patterns.items())
+        alternatives = []
+        for i, (pattern, match) in enumerate(self.patterns):
+            dir = pattern.endswith("/")
+            body = pattern[:-1] if dir else pattern
+            if "/" in body or body != body.strip():
+                pass
+            elif not is_glob(body):
+                self.names.setdefault(body, []).append((i, dir))
+                continue
+            elif body[1:].startswith(".") and body[0] == "*" and not is_glob(body[1:]):
+                # the lookups start at the dots of a name, other suffixes use the regex.
+                self.suffixes.setdefault(body[1:], []).append((i, dir))
+                continue
+            # the named groups in the pathspec regexes would collide in the alternation.
+            regex = re.sub(r"\(\?P<\w+>", "(?:", match.regex.pattern)
+            alternatives.append(f"(?P<_{i}>{regex})")
+        self.regex = re.compile("|".join(alternatives) or "(?!)")
+
+    def by(self, object):
+        """return the pattern that ignores the object"""
+        object = str(object)
+        parts = object.split("/")
+        last, best = len(parts) - 1, len(self.patterns)
+        for i, part in enumerate(parts):
+            for j, dir in self.names.get(part, ()):
+                if j < best and (i < last or not dir):
+                    best = j
+            dot = part.find(".")
+            while dot >= 0:
+                for j, dir in self.suffixes.get(part[dot:], ()):
+                    if j < best and (i < last or not dir):
+                        best = j
+                dot = part.find(".", dot + 1)
+        match = self.regex.match(object)
+        if match:
+            best = min(best, int(match.lastgroup[1:]))
+        if best < len(self.patterns):
+            pattern, match = self.patterns[best]
+            if match.include is not False:
+                return pattern
+
+
+def is_glob(str):
+    """does the gitignore pattern need a regular expression"""
+    return any(x in str for x in "*?[\\!")
+
+
+def compiled_ignore(cache={}):
+    """compile the default ignore patterns once."""
+    if not cache:
+        cache[None] = Ignore(ignore())
+    return cache[None]
+
+
 def ignored_by(object):
     """return the pattern that ignores the object"""
-    for k, v in ignore().items():
-        try:
-            next(v.match([str(object)]))
-            return k
-        except StopIteration:
-            continue
+    return compiled_ignore().by(object)
 
 
 def ignored(object):
@@ -1,18 +1,31 @@
 """configure packages, documentation, and tests."""
 
+import ast
 import asyncio
+import collections
+import contextlib
+import dataclasses
 import json
 import pathlib
+import re
 import shutil
 import sys
 import textwrap
 
 import doit
 
+try:
+    import importlib.metadata
+except ModuleNotFoundError:
+    import importlib
+
+    import importlib_metadata
+
+    importlib.metadata = importlib_metadata
+
 from . import (
     BUILD,
     BUILDSYSTEM,
-    Chapter,
     CONF,
     CONFIG,
     CONVENTIONS,
@@ -20,6 +33,8 @@ from . import (
     DOIT_CONFIG,
     ENVIRONMENT_YAML,
     File,
+    flush,
+    get_chapter,
     get_description,
     get_license,
     get_name,
@@ -35,6 +50,7 @@ from . import (
     Param,
     Path,
     PRECOMMITCONFIG_YML,
+    prewarm_templates,
     PYPROJECT_TOML,
     Repo,
     REQUIREMENTS_DOCS_TXT,
@@ -42,6 +58,7 @@ from . import (
     REQUIREMENTS_TXT,
     SETUP_CFG,
     SETUP_PY,
+    snapshot,
     Task,
     templated_file,
     TOC,
@@ -57,15 +74,37 @@ _BACKEND = Param(
 )
 
 
+_UPDATE = Param(
+    "update",
+    "",
+    short="u",
+    long="update",
+    type=str,
+    help="a json or yaml list of records with import_name, pypi_name, and conda_name keys, "
+    "without it the records come from depfinder, which installs requests_cache",
+)
+MAPPING_TSV = Path(__file__).parent / "mapping.tsv"
+
+
 def task_requirements_txt():
     """infer the project dependencies and write them to a requirements.txt"""
 
     def requirements():
-        chapter = Chapter()
-        REQUIREMENTS_TXT.update(pip_requirements(chapter.source_files()))
-        pip = pip_requirements(chapter.test_files()) + ["pytest"]
+        chapter, report = get_chapter(), {}
+        imports = partitioned_imports(
+            dict(
+                source=chapter.source_files(),
+                test=chapter.test_files(),
+                docs=chapter.docs_files(),
+            ),
+            report,
+        )
+        for file, reasons in sorted(report.items()):
+            print(f"""sampled the imports of {file}: {", ".join(reasons)}""")
+        REQUIREMENTS_TXT.update(import_to_pypi(imports["source"]))
+        pip = import_to_pypi(imports["test"]) + ["pytest"]
         pip and REQUIREMENTS_TEST_TXT.update(pip)
-        pip = pip_requirements(chapter.docs_files())
+        pip = import_to_pypi(imports["docs"])
         pip and REQUIREMENTS_DOCS_TXT.update(pip)
 
     return Task(
@@ -75,6 +114,22 @@ def task_requirements_txt():
     )
 
 
+def task_mapping():
+    """update the import, pypi, and conda name mapping from a local json or yaml file.
+
+    without --update the records come from depfinder, importing it installs requests_cache."""
+
+    def update(update):
+        if update:
+            records = File(update).load(edit=False)
+        else:
+            records = _import_depfinder().utils.mapping_list
+        forget_mapping()
+        Mapping.write(records, options.cache / MAPPING_TSV.name)
+
+    return Task(actions=[update], params=[_UPDATE], uptodate=[False])
+
+
 def task_environment_yaml():
     """infer the project dependencies and write them to an environment.yaml"""
 
@@ -93,30 +148,35 @@ def task_environment_yaml():
     )
 
 
+@snapshot
+def get_metadata():
+    """compose the project metadata that the templates are rendered with."""
+    chapter = get_chapter()
+    repo = Repo()
+    return dict(
+        author=repo.get_author(),
+        classifiers=[],
+        docs_requires=File("requirements-docs.txt").load(),
+        email=repo.get_email(),
+        keywords=[],
+        license=get_license(),
+        name=get_name(),
+        python_version="3.7.1",  # get_python_version(),
+        requires=REQUIREMENTS_TXT.load(),
+        test_requires=REQUIREMENTS_TEST_TXT.load(),
+        url=repo.get_url(),
+        long_description=None,
+        version=get_version(),
+        description=get_description(),
+        exclude=[str(x / "*") for x in chapter.exclude_directories],
+    )
+
+
 def task_pyproject():
     """infer the pyproject.toml configuration for the project"""
 
     def python(backend):
-        chapter = Chapter()
-        repo = Repo()
-        # compose a payload to pass to the templates
-        metadata = dict(
-            author=repo.get_author(),
-            classifiers=[],
-            docs_requires=File("requirements-docs.txt").load(),
-            email=repo.get_email(),
-            keywords=[],
-            license=get_license(),
-            name=get_name(),
-            python_version="3.7.1",  # get_python_version(),
-            requires=REQUIREMENTS_TXT.load(),
-            test_requires=REQUIREMENTS_TEST_TXT.load(),
-            url=repo.get_url(),
-            long_description=None,
-            version=get_version(),
-            description=get_description(),
-            exclude=[str(x / "*") for x in chapter.exclude_directories],
-        )
+        metadata = get_metadata()
         tool = templated_file("pytest.json", metadata)
         tool = merge(dict(tool=dict(flakehell={})), tool)
 
@@ -145,6 +205,8 @@ def task_pyproject():
                     f"-d {x}"
                     for x in metadata["test_requires"] + metadata["docs_requires"]
                 ]
+                # poetry edits the pyproject.toml we just wrote.
+                flush()
                 assert not doit.tools.CmdAction(
                     f"""poetry add {requires} {dev_deps} --lock"""
                 ).execute(sys.stdout, sys.stderr)
@@ -155,8 +217,15 @@ def task_pyproject():
             data = merge(tool, templated_file("setuptools.toml.json", {}))
             PYPROJECT_TOML.update(data)
 
+    prewarm_templates(
+        "pytest.json",
+        "flit.json",
+        "poetry.json",
+        "setuptools.cfg.json",
+        "setuptools.toml.json",
+    )
     task_dep = []
-    chapter = Chapter()
+    chapter = get_chapter()
 
     # when we only find notebooks, let's install jupytext
     # at least on binders and hubs
@@ -178,7 +247,7 @@ def task_jupytext():
     we only trigger this if there are no python files.
 
     jupytext provides a nice general developer affordance for teaching and developing."""
-    chapter = Chapter()
+    chapter = get_chapter()
 
     def jupytext(task):
         needs("jupytext")
@@ -205,7 +274,7 @@ def task_toc():
     """infer the table of contents for the jupyter_book documentation."""
 
     def main():
-        TOC.write(get_section(Chapter()))
+        TOC.write(get_section(get_chapter()))
 
     return Task(actions=[(doit.tools.create_folder, [DOCS]), main], targets=[TOC])
 
@@ -215,7 +284,7 @@ def task_config():
 
     def main():
         repo = Repo(get_repo())
-        chapter = Chapter()
+        chapter = get_chapter()
         data = templated_file(
             "_config.json",
             dict(
@@ -228,6 +297,7 @@ def task_config():
         )
         CONFIG.update(data)
 
+    prewarm_templates("_config.json")
     return Task(actions=[(doit.tools.create_folder, [DOCS]), main], targets=[CONFIG])
 
 
@@ -235,27 +305,10 @@ def task_mkdocs_yml():
     """infer the mkdocs documentation configuration."""
 
     def mkdocs():
-        chapter = Chapter()
-        repo = Repo()
-        metadata = dict(
-            author=repo.get_author(),
-            classifiers=[],
-            docs_requires=File("requirements-docs.txt").load(),
-            email=repo.get_email(),
-            keywords=[],
-            license=get_license(),
-            name=get_name(),
-            python_version="3.7.1",  # get_python_version(),
-            requires=REQUIREMENTS_TXT.load(),
-            test_requires=REQUIREMENTS_TEST_TXT.load(),
-            url=repo.get_url(),
-            long_description=None,
-            version=get_version(),
-            description=get_description(),
-            exclude=[str(x / "*") for x in chapter.exclude_directories],
-        )
+        metadata = get_metadata()
         MKDOCS.write(templated_file("mkdocs.json", metadata))
 
+    prewarm_templates("mkdocs.json")
     return Task(actions=[mkdocs], targets=[MKDOCS])
 
 
@@ -271,60 +324,94 @@ def task_precommit():
     return Task(targets=[PRECOMMITCONFIG_YML])
 
 
-def get_section(chapter, parent=Path(), *done, **section):
+def get_section(chapter, parent=Path(), index=None, **section):
     """generate the nested jupyter book table of contents format for the chapter."""
-    files = [
-        x
-        for x in chapter.include
-        if 1 == (len(x.parts) - len(parent.parts))
-        and x.is_relative_to(parent)
-        and x not in CONVENTIONS
-        and not is_private(x)
-    ]
-    index = None
+    if index is None:
+        index = get_toc_index(chapter)
+    files, directories = index.get(str(parent), ([], []))
+    index_file = None
     for name in "index readme".split():
         for file in files:
-            if file.stem.lower() == name:
-                index = file
+            stem, suffix, target = file
+            if stem.lower() == name:
+                index_file = file
                 if "file" not in section:
-                    section.update(file=str(file.with_suffix("")), sections=[])
+                    section.update(file=target, sections=[])
                 else:
-                    section["sections"].append(str(file.with_suffix("")))
+                    section["sections"].append(target)
 
-    if index is None:
+    if index_file is None:
         section = dict(file=None, sections=[])
 
     for file in files:
-        if file == index:
+        stem, suffix, target = file
+        if file is index_file:
             continue
-        if file.suffix in {".py", ".ipynb", ".md", ".rst"}:
-            index = file
+        if suffix in {".py", ".ipynb", ".md", ".rst"}:
+            index_file = file
             if section["file"] is None:
-                section["file"] = str(file.with_suffix(""))
+                section["file"] = target
             else:
-                section["sections"].append(dict(file=str(file.with_suffix(""))))
-
-    for dir in [DOCS] + [
-        x
-        for x in chapter.directories
-        if x.is_relative_to(parent) and x not in CONVENTIONS and not is_private(x)
-    ]:
-        if dir == parent:
-            continue
-        if dir not in done:
-            section["sections"].append(get_section(chapter, dir, *done))
-            if section["sections"][-1]["file"] == None:
-                section["sections"].pop(-1)
-            done += (dir,)
+                section["sections"].append(dict(file=target))
+
+    for dir in directories:
+        section["sections"].append(get_section(chapter, dir, index))
+        if section["sections"][-1]["file"] == None:
+            section["sections"].pop(-1)
 
     return section
 
 
+def get_toc_index(chapter):
+    """index the files and directories of the chapter by their parent directory.
+
+    the keys are the string paths of the directories, files are indexed by their stem, suffix, and entry.
+    conventions and private paths are left out of the table of contents.
+    a directory is listed under its nearest ancestor that is listed, the documentation directory comes first at the root.
+    """
+    conventions = set(map(str, CONVENTIONS))
+    index = collections.defaultdict(lambda: ([], []))
+    for file in chapter.include:
+        name, path = file.name, str(file)
+        if path in conventions or name.startswith((".", "-")):
+            continue
+        dot = name.rfind(".")
+        suffix = name[dot:] if 0 < dot < len(name) - 1 else ""
+        index[path.rpartition("/")[0] or "."][0].append(
+            (
+                name[: len(name) - len(suffix)],
+                suffix,
+                path[: len(path) - len(suffix)],
+            )
+        )
+
+    listed = {Path(), DOCS}
+    listed.update(
+        x for x in chapter.directories if x not in CONVENTIONS and not is_private(x)
+    )
+    index["."][1].append(DOCS)
+    for dir in chapter.directories:
+        if dir not in listed or dir in {Path(), DOCS}:
+            continue
+        parent = dir.parent
+        while parent not in listed:
+            parent = parent.parent
+        index[str(parent)][1].append(dir)
+    return index
+
+
 def rough_source(nb):
-    """extract a rough version of the source in notebook to infer files from"""
+    """extract a rough version of the source in notebook to infer files from
+
+    the text of a notebook is scanned for the code cells without decoding the outputs."""
 
-    if isinstance(nb, str):
-        nb = json.loads(nb)
+    if isinstance(nb, (str, bytes)):
+        data = nb.encode() if isinstance(nb, str) else nb
+        try:
+            return "\n".join(textwrap.dedent(x) for x in code_sources(data))
+        except (AttributeError, IndexError, ValueError):
+            # let json report malformed notebooks.
+            nb = json.loads(data)
 
     return "\n".join(
         textwrap.dedent("".join(x["source"]))
@@ -333,6 +420,165 @@ def rough_source(nb):
     )
 
 
+SEPARATORS = re.compile(rb"[\s,:]*")
+STRUCTURE = re.compile(rb'["\[\]{}]')
+SCALAR = re.compile(rb"[\s,\]}]")
+
+
+def skip_string(data, i):
+    """the index after the json string that starts at i."""
+    i = data.index(b'"', i + 1)
+    while data[i - 1] == 92:
+        # an even number of backslashes escape each other, not the quote.
+        j = i - 1
+        while data[j - 1] == 92:
+            j -= 1
+        if (i - j) % 2 == 0:
+            break
+        i = data.index(b'"', i + 1)
+    return i + 1
+
+
+def skip_value(data, i):
+    """the index after the json value that starts at i, nested values are never decoded."""
+    if data[i] == 34:
+        return skip_string(data, i)
+    if data[i] not in b"[{":
+        return SCALAR.search(data, i).start()
+    depth, search, find = 0, STRUCTURE.search, data.find
+    while True:
+        i = search(data, i).start()
+        c = data[i]
+        if c == 34:
+            # most strings have no escaped quotes, skip them without a call.
+            end = find(b'"', i + 1)
+            if end < 0:
+                raise ValueError("unterminated string")
+            i = end + 1 if data[end - 1] != 92 else skip_string(data, i)
+        elif c == 91 or c == 123:
+            depth += 1
+            i += 1
+        else:
+            depth -= 1
+            i += 1
+            if not depth:
+                return i
+
+
+def json_object(data, i):
+    """the spans of the values in the json object that starts at i, and the index after it."""
+    object, i = {}, SEPARATORS.match(data, i + 1).end()
+    while data[i] != 125:
+        end = skip_string(data, i)
+        key, i = data[i + 1 : end - 1], SEPARATORS.match(data, end).end()
+        end = skip_value(data, i)
+        object[key], i = (i, end), SEPARATORS.match(data, end).end()
+    return object, i + 1
+
+
+def code_sources(data):
+    """iterate the sources of the code cells in the bytes of a notebook.
+
+    every byte is scanned once, only the cell types and sources are decoded."""
+    i = SEPARATORS.match(data, SEPARATORS.match(data).end() + 1).end()
+    while data[i] != 125:
+        end = skip_string(data, i)
+        key, i = data[i + 1 : end - 1], SEPARATORS.match(data, end).end()
+        if key == b"cells":
+            break
+        i = SEPARATORS.match(data, skip_value(data, i)).end()
+    else:
+        return
+    i = SEPARATORS.match(data, i + 1).end()
+    while data[i] != 93:
+        cell, i = json_object(data, i)
+        i = SEPARATORS.match(data, i).end()
+        if json.loads(data[slice(*cell[b"cell_type"])]) == "code":
+            source = json.loads(data[slice(*cell[b"source"])])
+            yield source if isinstance(source, str) else "".join(source)
+
+
+# bump the version when the scanner finds different imports, it invalidates the cache.
+SCANNER_VERSION = 1
+QUESTIONABLE = tuple(
+    getattr(ast, x)
+    for x in "Try TryStar FunctionDef AsyncFunctionDef If While For AsyncFor match_case".split()
+    if hasattr(ast, x)
+)
+DYNAMIC = {"import_module", "__import__"}
+
+
+def stdlib_module_names(cache={}):
+    """the top level modules in the standard library."""
+    if not cache:
+        names = getattr(sys, "stdlib_module_names", None)
+        if names is None:
+            import pkgutil
+            import sysconfig
+
+            names = set(sys.builtin_module_names) | set(
+                x.name for x in pkgutil.iter_modules([sysconfig.get_paths()["stdlib"]])
+            )
+        cache[None] = frozenset(names)
+    return cache[None]
+
+
+def scan_imports(source):
+    """find the imports in python source with the ast module, the payload has the shape depfinder describes.
+
+    imports outside of functions, loops, conditions, and try blocks are required, the others are questionable.
+    `importlib.import_module` and `__import__` calls with a literal name are questionable too.
+    """
+    if "import" not in source:
+        return {}
+    object = collections.defaultdict(set)
+    # skip the ipython magics like depfinder does.
+    source = "\n".join(x for x in source.split("\n") if not x.startswith("%"))
+    stdlib = stdlib_module_names()
+    dynamic = any(x in source for x in DYNAMIC)
+
+    def add(name, questionable):
+        name = name.partition(".")[0]
+        if name in stdlib:
+            object["builtin"].add(name)
+        else:
+            object["questionable" if questionable else "required"].add(name)
+
+    stack = [(ast.parse(source), False)]
+    while stack:
+        node, questionable = stack.pop()
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                add(alias.name, questionable)
+            continue
+        if isinstance(node, ast.ImportFrom):
+            if node.level:
+                if node.module:
+                    object["relative"].add(node.module.partition(".")[0])
+            else:
+                add(node.module, questionable)
+            continue
+        if dynamic and isinstance(node, ast.Call) and node.args:
+            callable, (first, *_) = node.func, node.args
+            name = getattr(callable, "attr", getattr(callable, "id", None))
+            # python 3.7 parses string literals as ast.Str, they hold the value in s.
+            value = getattr(first, "value", getattr(first, "s", None))
+            if name in DYNAMIC and isinstance(value, str) and not value.startswith("."):
+                add(value, True)
+        questionable = questionable or isinstance(node, QUESTIONABLE)
+        if dynamic:
+            children = ast.iter_child_nodes(node)
+        else:
+            # only statements hold imports, skip the expressions.
+            children = (
+                x
+                for field in ("body", "orelse", "finalbody", "handlers", "cases")
+                for x in getattr(node, field, None) or ()
+            )
+        stack.extend((x, questionable) for x in children)
+    return dict(object)
+
+
 def _import_depfinder():
     import os
     import yaml
@@ -359,70 +605,494 @@ def _import_depfinder():
     return depfinder
 
 
-async def infer(file):
-    """infer imports from different kinds of files."""
+def import_cache(file=None):
+    """open the sqlite cache of depfinder payloads, the keys hash the contents of the files."""
+    import sqlite3
+
+    file = Path(file or options.cache / "imports.sqlite")
+    try:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(file))
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS imports (hash TEXT PRIMARY KEY, payload TEXT)"
+        )
+    except (OSError, sqlite3.Error):
+        # the cache is an optimization, without it we parse every file.
+        return None
+    return connection
+
+
+def content_hash(suffix, data, backend=None, cache={}):
+    """hash the contents of a file with its suffix and the version of the scanner that parses it.
+
+    the limits that decide which files are sampled are part of the version."""
+    import hashlib
+
+    version = backend or options.imports, options.max_bytes, options.max_line
+    if version not in cache:
+        if version[0] == "depfinder":
+            prefix = importlib.metadata.version("depfinder")
+        else:
+            prefix = f"{version[0]}-{SCANNER_VERSION}"
+        cache[
+            version
+        ] = f"{prefix}-{version[1]}-{version[2]}-{SAMPLER_VERSION}".encode()
+    return hashlib.sha1(
+        cache[version] + b"\0" + suffix.encode() + b"\0" + data
+    ).hexdigest()
+
+
+def cached(cache, key):
+    """the cached depfinder payload for a content hash."""
+    if cache is not None:
+        row = cache.execute(
+            "SELECT payload FROM imports WHERE hash = ?", (key,)
+        ).fetchone()
+        if row:
+            return {k: set(v) for k, v in json.loads(row[0]).items()}
+
+
+def store(cache, key, payload):
+    # a timeout depends on the load of the machine, the next run parses the file again.
+    if cache is not None and "timeout" not in payload.get("sampled", ()):
+        cache.execute(
+            "INSERT OR REPLACE INTO imports VALUES (?, ?)",
+            (key, json.dumps({k: sorted(v) for k, v in payload.items()})),
+        )
+
+
+# bump the version when different files are sampled, it invalidates the cache.
+SAMPLER_VERSION = 2
+# the leading comment lines of a file, generated files say so in their header.
+HEADER = re.compile(rb"(?:[ \t]*(?:#[^\n]*)?\n)*")
+GENERATED = re.compile(
+    rb"^[ \t]*#.*(?:@generated|do not edit|auto-?generated)",
+    re.IGNORECASE | re.MULTILINE,
+)
+SAMPLE = re.compile(
+    rb"^(?:from[ \t]+([\w.]+)[ \t]+import\b|import[ \t]+([\w., \t]+))", re.MULTILINE
+)
+
+
+def sampled(data):
+    """the reason to sample a file instead of parsing it, or None.
+
+    large files, generated files, and minified files with long lines are sampled."""
+    if len(data) > options.max_bytes:
+        return "size"
+    if GENERATED.search(data, 0, HEADER.match(data, 0, 2**12).end()):
+        return "generated"
+    if re.search(rb"[^\n]{%d}" % options.max_line, data[: 2**16]):
+        return "long lines"
+
+
+def sample_imports(data, reason):
+    """the imports at the start of lines, they are treated as top level imports.
+
+    the payload lists the reason the file was sampled."""
+    object, stdlib = collections.defaultdict(set), stdlib_module_names()
+    for module, names in SAMPLE.findall(data):
+        for name in [module] if module else names.split(b","):
+            words = name.split()
+            if not words:
+                continue
+            name = words[0].decode()
+            top = name.lstrip(".").partition(".")[0]
+            if name.startswith("."):
+                kind = "relative"
+            elif top in stdlib:
+                kind = "builtin"
+            else:
+                kind = "required"
+            if top:
+                object[kind].add(top)
+    object["sampled"].add(reason)
+    return dict(object)
+
+
+@contextlib.contextmanager
+def budget(seconds):
+    """raise a TimeoutError when the block runs longer than seconds.
+
+    the alarm only interrupts the main thread, iter_imports parses in worker processes when there is a budget."""
+    import signal
+    import threading
+
+    if not (
+        seconds
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    ):
+        yield
+        return
+
+    def alarm(*args):
+        raise TimeoutError
+
+    previous = signal.signal(signal.SIGALRM, alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def parse(suffix, data, backend=None, seconds=None):
+    """parse the imports from the contents of a file with depfinder or the ast scanner.
+
+    the files that are too large, generated, or slower than seconds to parse are sampled."""
+    if suffix == ".ipynb":
+        source = rough_source(data)
+    else:
+        reason = sampled(data)
+        if reason:
+            return sample_imports(data, reason)
+        source = data.decode()
+    try:
+        with budget(options.file_budget if seconds is None else seconds):
+            if (backend or options.imports) == "ast":
+                return scan_imports(source)
+            depfinder = _import_depfinder()
+            return depfinder.main.get_imported_libs(source).describe()
+    except SyntaxError:
+        return {}
+    except TimeoutError:
+        return sample_imports(source.encode(), "timeout")
+
+
+def parse_chunk(chunk, backend=None, seconds=None):
+    """parse a batch of files in a worker process."""
+    return [parse(*x, backend=backend, seconds=seconds) for x in chunk]
+
+
+async def read(file):
+    """read the bytes of a file we can infer imports from."""
     import aiofiles
 
-    depfinder = _import_depfinder()
+    if file.suffix not in {".py", ".ipynb", ".md", ".rst"}:
+        return None
+    async with aiofiles.open(file, "rb") as f:
+        return await f.read()
 
-    async with aiofiles.open(file, "r") as f:
-        if file.suffix not in {".py", ".ipynb", ".md", ".rst"}:
-            return file, {}
-        source = await f.read()
-        if file.suffix == ".ipynb":
-            source = rough_source(source)
-        try:
-            return (file, depfinder.main.get_imported_libs(source).describe())
-        except SyntaxError:
-            return file, {}
 
+def notebook_cells(data):
+    """the content hashes and dedented sources of the code cells in a notebook.
 
-async def infer_files(files):
+    the cells hash like python files with the same source, so they share cached payloads.
+    the scan runs on the event loop, notebooks over options.max_notebook and malformed notebooks
+    have no cells and are parsed whole with the chunks."""
+    if len(data) > options.max_notebook:
+        return []
+    try:
+        sources = [textwrap.dedent(x).encode() for x in code_sources(data)]
+    except (AttributeError, IndexError, ValueError):
+        return []
+    return [(content_hash(".py", x), x) for x in sources]
+
+
+def merge_payloads(payloads):
+    """the union of the imports in each kind of payload."""
+    object = collections.defaultdict(set)
+    for payload in payloads:
+        for k, v in payload.items():
+            object[k].update(v)
+    return dict(object)
+
+
+# a chunk holds at most CHUNK_FILES files or about CHUNK_BYTES bytes,
+# so the sources in flight are bounded by the number of jobs and not the number of files.
+CHUNK_FILES, CHUNK_BYTES = 256, 2**22
+
+
+async def iter_imports(files, jobs=None, progress=None):
+    """yield the files and their payloads as they are inferred.
+
+    a fixed number of readers keeps at most options.open_files files open,
+    the cache misses are parsed in chunks and at most two chunks per job wait for the pool.
+    progress is called with the number of finished files and the total."""
+    import concurrent.futures
+
+    files = list(map(Path, dict.fromkeys(files)))
+    jobs, progress = jobs or options.jobs, progress or options.progress
+    size = min(CHUNK_FILES, max(16, -(-len(files) // (jobs * 4))))
+    loop, queue, pending = asyncio.get_running_loop(), asyncio.Queue(), iter(files)
+    slots, running, pool, chunk = asyncio.Semaphore(2 * jobs), set(), None, []
+    chunk_bytes = 0
+    notebooks = {}
+    cache = import_cache()
+
+    def finish(batch, payloads):
+        for (owner, key, *_), payload in zip(batch, payloads):
+            store(cache, key, payload)
+            if isinstance(owner, tuple):
+                # a cell of a notebook, the notebook is done with its last cell.
+                owner, i = owner
+                notebook = notebooks[owner]
+                notebook["cells"][i] = payload
+                if None in notebook["cells"]:
+                    continue
+                payload = merge_payloads(notebooks.pop(owner)["cells"])
+                store(cache, notebook["key"], payload)
+            queue.put_nowait((owner, payload))
+
+    async def parse_batch(batch):
+        try:
+            payloads = await loop.run_in_executor(
+                pool,
+                parse_chunk,
+                [(suffix, data) for _, _, suffix, data in batch],
+                options.imports,
+                options.file_budget,
+            )
+        finally:
+            slots.release()
+        finish(batch, payloads)
+
+    async def submit(final=False):
+        nonlocal pool, chunk, chunk_bytes
+        batch, chunk, chunk_bytes = chunk, [], 0
+        if pool is None:
+            # a single job and the small batches skip the process pool start up,
+            # they are parsed off the event loop so a running loop stays responsive.
+            # the budget of a file needs the alarm of a worker process, it never interrupts a thread.
+            if (jobs < 2 or final) and not options.file_budget:
+                pool = concurrent.futures.ThreadPoolExecutor(1)
+            else:
+                pool = concurrent.futures.ProcessPoolExecutor(1 if final else jobs)
+        await slots.acquire()
+        running.add(asyncio.ensure_future(parse_batch(batch)))
+
+    async def reader():
+        nonlocal chunk_bytes
+        for file in pending:
+            data = await read(file)
+            if data is None:
+                queue.put_nowait((file, {}))
+                continue
+            key = content_hash(file.suffix, data)
+            payload = cached(cache, key)
+            if payload is not None:
+                queue.put_nowait((file, payload))
+                continue
+            cells = file.suffix == ".ipynb" and notebook_cells(data)
+            if not cells:
+                chunk.append((file, key, file.suffix, data))
+                chunk_bytes += len(data)
+            else:
+                # only the cells that changed since the last run are parsed.
+                notebook = notebooks[file] = dict(
+                    key=key, cells=[cached(cache, x) for x, _ in cells]
+                )
+                for i, (x, source) in enumerate(cells):
+                    if notebook["cells"][i] is None:
+                        chunk.append(((file, i), x, ".py", source))
+                        chunk_bytes += len(source)
+                if None not in notebook["cells"]:
+                    finish([(file, key)], [merge_payloads(notebook["cells"])])
+                    del notebooks[file]
+            if len(chunk) >= size or chunk_bytes >= CHUNK_BYTES:
+                await submit()
+
+    async def produce():
+        try:
+            await asyncio.gather(*(reader() for _ in range(options.open_files)))
+            if chunk:
+                await submit(final=True)
+            await asyncio.gather(*running)
+        finally:
+            queue.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        done = 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            done += 1
+            progress and progress(done, len(files))
+            yield item
+        await producer
+    finally:
+        producer.cancel()
+        for x in running:
+            x.cancel()
+        if pool is not None:
+            pool.shutdown()
+        if cache is not None:
+            cache.commit()
+            cache.close()
+
+
+async def infer_files(files, jobs=None, progress=None):
     """use gather_imports to execute this function"""
-    return dict(await asyncio.gather(*(infer(file) for file in map(Path, set(files)))))
+    return {
+        file: payload async for file, payload in iter_imports(files, jobs, progress)
+    }
 
 
-def gather_imports(files):
-    """use gather_imports gather the inferred import dependencies"""
+async def partition_imports(partitions, jobs=None, progress=None, report=None):
+    """merge the required and questionable imports of each partition of files as they are inferred.
+
+    a file in many partitions is read and parsed once.
+    the report collects the reasons files were sampled instead of parsed."""
+    owners = collections.defaultdict(list)
+    for name, files in partitions.items():
+        for file in files:
+            owners[Path(file)].append(name)
+    object = {name: set() for name in partitions}
+    async for file, payload in iter_imports(owners, jobs, progress):
+        if report is not None and payload.get("sampled"):
+            report[file] = sorted(payload["sampled"])
+        for name in owners[file]:
+            object[name].update(
+                payload.get("required", ()), payload.get("questionable", ())
+            )
+    return {k: sorted(v) for k, v in object.items()}
+
+
+async def merge_imports(files, jobs=None, progress=None):
+    """merge the required and questionable imports as the files are inferred."""
+    return (await partition_imports(dict(files=files), jobs, progress))["files"]
 
-    object = infer_files(files)
+
+def run_coroutine(object):
+    """run a coroutine to completion.
+
+    inside a running event loop, like a jupyter kernel, the coroutine runs on its own loop in a thread,
+    the running loop is never patched."""
     try:
-        return dict(asyncio.run(object))
+        asyncio.get_running_loop()
     except RuntimeError:
-        __import__("nest_asyncio").apply()
-        return dict(asyncio.run(object))
+        return asyncio.run(object)
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(1) as pool:
+        return pool.submit(asyncio.run, object).result()
+
+
+async def gather_imports_async(files, jobs=None, progress=None):
+    """gather the inferred import dependencies from a running event loop"""
+    return await infer_files(files, jobs, progress)
+
+
+def gather_imports(files, jobs=None):
+    """use gather_imports gather the inferred import dependencies"""
+    return run_coroutine(gather_imports_async(files, jobs))
 
 
 def merged_imports(files):
     """transform the depfinder payload to only the external imports"""
-    results = merge(*gather_imports(files).values())
-    return sorted(
-        set(list(results.get("required", [])) + list(results.get("questionable", [])))
-    )
+    return run_coroutine(merge_imports(files))
+
+
+def partitioned_imports(partitions, report=None):
+    """the external imports of each partition of files from one inference pass"""
+    return run_coroutine(partition_imports(partitions, report=report))
 
 
 def import_to_pypi(list):
     """convert canonical import names to pypi package names"""
-    global IMPORT_TO_PIP
-    if not IMPORT_TO_PIP:
-        depfinder = _import_depfinder()
-        IMPORT_TO_PIP = {
-            x["import_name"]: x["pypi_name"] for x in depfinder.utils.mapping_list
-        }
-    return [IMPORT_TO_PIP.get(x, x) for x in list if x not in ["src"]]
+    table = mapping()
+    return [table.get("import", x) or x for x in list if x not in ["src"]]
 
 
 def pypi_to_conda(list):
     """convert pypi package names to conda package names"""
+    table = mapping()
+    return [table.get("pypi", x) or x for x in list]
+
+
+@dataclasses.dataclass
+class Mapping:
+    """a sorted table of names that is binary searched through a memory map.
+
+    every line holds a table, a key, and a value separated by tabs,
+    the lines are sorted by their bytes and names that map to themselves are left out."""
+
+    file: Path = MAPPING_TSV
+
+    def __post_init__(self):
+        self.file, self.map = Path(self.file), None
+
+    def open(self):
+        import mmap
+
+        if self.map is None:
+            with open(self.file, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def close(self):
+        """close the memory map, the next lookup opens it again."""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def get(self, table, key):
+        """find the value of a key in a table, or None."""
+        data, target = self.open(), f"{table}\t{key}".encode()
+        lo, hi = 0, len(data)
+        while lo < hi:
+            start = data.rfind(b"\n", 0, (lo + hi) // 2) + 1
+            end = data.find(b"\n", start)
+            end = len(data) if end < 0 else end
+            line_table, line_key, value = data[start:end].split(b"\t")
+            line = line_table + b"\t" + line_key
+            if line < target:
+                lo = end + 1
+            elif line > target:
+                hi = start
+            else:
+                return value.decode()
+
+    @classmethod
+    def write(cls, records, file=MAPPING_TSV):
+        """write the table for records with import_name, pypi_name, and conda_name keys.
+
+        when names repeat, static records win, then names that map to themselves, then the first record."""
+        tables, ranks = {"import": {}, "pypi": {}}, {}
+        for x in records:
+            for table, k, v in (
+                ("import", x["import_name"], x["pypi_name"]),
+                ("pypi", x["pypi_name"], x["conda_name"]),
+            ):
+                rank = x.get("mapping_source") == "static", k == v
+                if (table, k) not in ranks or rank > ranks[table, k]:
+                    tables[table][k], ranks[table, k] = v, rank
+        lines = sorted(
+            f"{table}\t{k}\t{v}".encode()
+            for table, object in tables.items()
+            for k, v in object.items()
+            if k != v
+        )
+        file = Path(file)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        next = file.with_name(file.name + ".tmp")
+        next.write_bytes(b"\n".join(lines) + b"\n")
+        next.replace(file)
+        return cls(file)
+
+
+MAPPINGS = {}
 
-    global PIP_TO_CONDA
 
-    if not PIP_TO_CONDA:
-        depfinder = _import_depfinder()
-        PIP_TO_CONDA = {
-            x["import_name"]: x["conda_name"] for x in depfinder.utils.mapping_list
-        }
-    return [PIP_TO_CONDA.get(x, x) for x in list]
+def mapping():
+    """open the name mapping, an updated mapping in the cache wins over the bundled one."""
+    file = options.cache / MAPPING_TSV.name
+    file = file if file.exists() else MAPPING_TSV
+    if file not in MAPPINGS:
+        forget_mapping()
+        MAPPINGS[file] = Mapping(file)
+    return MAPPINGS[file]
+
+
+def forget_mapping():
+    """close the open name mapping, the next lookup reads the mapping files again."""
+    for x in MAPPINGS.values():
+        x.close()
+    MAPPINGS.clear()
 
 
 def pip_requirements(files):
@@ -430,9 +1100,6 @@ def pip_requirements(files):
     return import_to_pypi(merged_imports(files))
 
 
-IMPORT_TO_PIP = None
-PIP_TO_CONDA = None
-
 # default tasks for the module
 
 if not REQUIREMENTS_TXT.exists():
@@ -443,7 +1110,7 @@ if shutil.which("mamba") or shutil.which("conda") and not ENVIRONMENT_YAML.exist
     DOIT_CONFIG["default_tasks"] += ["environment"]
 
 if PYPROJECT_TOML.exists():
-    if BUILDSYSTEM not in PYPROJECT_TOML.load():
+    if BUILDSYSTEM not in PYPROJECT_TOML.load(edit=False):
         # add the default task if we haven't defined a build system.
         DOIT_CONFIG["default_tasks"] += ["python"]
 else:
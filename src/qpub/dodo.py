@@ -145,7 +145,15 @@ def task_conda():
                 c += [dep]
             elif isinstance(dep, dict):
                 p = dep.pop("pip", [])
-        if c:
+        split = c and partition_conda(c)
+        if split:
+            # the local repodata knows the conda packages without solving.
+            c, missing = split
+            p += missing
+            if p:
+                c += ["pip"] * ("pip" not in c) + [dict(pip=p)]
+            file.write(dict(dependencies=c))
+        elif c:
             action = doit.tools.CmdAction(
                 f"""conda install --dry-run -cconda-forge {" ".join(c)}"""
             )
@@ -253,6 +261,7 @@ class options:
     monkeytype: bool = os.environ.get("QPUB_INTERACTIVE", False)
     mamba: bool = os.environ.get("QPUB_MAMBA", True)
     cache: str = Path(os.environ.get("QPUB_CACHE", Path(__file__).parent / "_data"))
+    repodata: str = os.environ.get("QPUB_REPODATA", "")
     dev: bool = os.environ.get("QPUB_DEV", True)
     pip_only: bool = os.environ.get("QPUB_PIP", False)
     install: bool = os.environ.get("QPUB_INSTALL", True)
@@ -384,6 +393,7 @@ class Chapter:
     conventions: list = dataclasses.field(default_factory=list, repr=False)
     hidden: list = dataclasses.field(default_factory=list, repr=False)
     exclude: object = None
+    inventory: object = dataclasses.field(default=None, repr=False, compare=False)
 
     _flit_module = None
 
@@ -413,22 +423,19 @@ class Chapter:
             or self.other
         ):
             return
-        contents = (
-            self.repo
-            and list(map(File, git.Git(self.dir).ls_files().splitlines()))
-            or None
-        )
-
-        for parent in contents or []:
-            if parent.parent not in contents:
-                contents += [parent.parent]
+        if self.inventory is None:
+            if self.parent:
+                self.inventory = self.parent.inventory
+            elif self.repo:
+                self.inventory = get_inventory(self.dir)
 
+        root = self.root().dir
         for file in self.dir.iterdir():
 
             local = file.relative_to(self.dir)
 
-            if contents is not None:
-                if local not in contents:
+            if self.inventory is not None:
+                if file.relative_to(root).as_posix() not in self.inventory:
                     continue
 
             if local in {DOCS}:
@@ -548,6 +555,35 @@ class Chapter:
         )
 
 
+def get_inventory(dir, cache={}):
+    """the files tracked by git and their parent directories.
+
+    the null separated output of `git ls-files -z` is streamed into a set of posix paths once per root,
+    the nested chapters share the same set. the set is listed again when the git index changes."""
+    dir = File(dir).absolute()
+    try:
+        stat = (dir / GIT / "index").stat()
+        stamp = stat.st_mtime_ns, stat.st_size
+    except OSError:
+        stamp = None
+    if dir in cache and cache[dir][0] == stamp:
+        return cache[dir][1]
+    inventory = set()
+    cache[dir] = stamp, inventory
+    process = git.Git(dir).ls_files("-z", as_process=True)
+    tail = b""
+    for chunk in iter(functools.partial(process.stdout.read, 2**16), b""):
+        *lines, tail = (tail + chunk).split(b"\0")
+        for line in lines:
+            path = os.fsdecode(line)
+            # stop at the first parent that is known, so every directory is visited once.
+            while path and path not in inventory:
+                inventory.add(path)
+                path = path.rpartition("/")[0]
+    process.wait()
+    return inventory
+
+
 def cached(callable):
     @functools.wraps(callable)
     def main(self, *args, **kwargs):
@@ -804,6 +840,21 @@ class Project(Chapter):
         """list imports discovered from the files."""
         return list(set(import_to_pypi(merged_imports(files))))
 
+    @cached
+    def get_imports(self):
+        """infer the imports of the source, test, and docs files in one pass."""
+        return partitioned_imports(
+            dict(
+                source=self.files(content=True),
+                test=[self / x for x in self.get_test_files()],
+                docs=self.docs.files() if self.docs else [],
+            )
+        )
+
+    def get_requires_from_partition(self, name):
+        """list the requirements of the source, test, or docs files."""
+        return list(set(import_to_pypi(self.get_imports()[name])))
+
     def get_requires_from_requirements_txt(self):
         """get any hardcoded dependencies in requirements.txt."""
         if (self / REQUIREMENTS_TXT).exists():
@@ -829,7 +880,7 @@ class Project(Chapter):
         return sorted(
             [
                 package
-                for package in self.get_requires_from_files(self.files(content=True))
+                for package in self.get_requires_from_partition("source")
                 if package.lower() not in known and package[0].isalpha()
             ]
         )
@@ -841,9 +892,7 @@ class Project(Chapter):
         requires = ["pytest", "pytest-sugar"]
         if ".ipynb" in self.suffixes:
             requires += ["nbval", "importnb"]
-        requires += self.get_requires_from_files(
-            self / x for x in self.get_test_files()
-        )
+        requires += self.get_requires_from_partition("test")
         return [x for x in requires if x not in [self.get_name()]]
 
     def get_docs_requires(self):
@@ -862,7 +911,7 @@ class Project(Chapter):
         if backend == "sphinx":
             requires += ["sphinx"]
         if self.docs:
-            requires += self.get_requires_from_files(self.docs.files())
+            requires += self.get_requires_from_partition("docs")
         return requires
 
     def is_flit(self):
@@ -1267,10 +1316,14 @@ def gather_imports(files):
 
     object = infer_files(files)
     try:
-        return dict(asyncio.run(object))
+        asyncio.get_running_loop()
     except RuntimeError:
-        __import__("nest_asyncio").apply()
         return dict(asyncio.run(object))
+    # run on a fresh loop in a thread instead of patching the running loop.
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(1) as pool:
+        return dict(pool.submit(asyncio.run, object).result())
 
 
 def merged_imports(files):
@@ -1280,6 +1333,24 @@ def merged_imports(files):
     )
 
 
+def partitioned_imports(partitions):
+    """infer the imports of every file once and merge them for each partition of files."""
+    partitions = {k: list(map(Path, v)) for k, v in partitions.items()}
+    payloads = gather_imports(set().union(*partitions.values()))
+    object = {}
+    for name, files in partitions.items():
+        # merge would update the payloads that partitions share, collect new sets.
+        object[name] = sorted(
+            set(
+                y
+                for x in files
+                for key in ("required", "questionable")
+                for y in payloads[x].get(key, ())
+            )
+        )
+    return object
+
+
 def merge(*args):
     if not args:
         return {}
@@ -1559,6 +1630,77 @@ def templated_file(template, data):
     return jsone.render(where_template(template).load(), data)
 
 
+REPODATA_NAME = re.compile(rb'"name":\s*"([^"]+)"')
+
+
+def repodata_files(repodata=None):
+    """find local repodata.json files, a path, a directory of channel subdirs, or conda's channel cache."""
+    repodata = repodata or options.repodata
+    if repodata:
+        repodata = Path(repodata)
+        return (
+            sorted(repodata.rglob("repodata.json")) if repodata.is_dir() else [repodata]
+        )
+    files = sorted((options.cache / "repodata").rglob("repodata.json"))
+    dirs = os.environ.get("CONDA_PKGS_DIRS", "").split(",")
+    if os.environ.get("CONDA_PREFIX"):
+        # without an active environment the join is relative, the project has no conda cache.
+        dirs += [os.path.join(os.environ["CONDA_PREFIX"], "pkgs")]
+    dirs += [os.path.expanduser("~/.conda/pkgs")]
+    for dir in filter(None, dirs):
+        for file in sorted(Path(dir, "cache").glob("*.json")):
+            # conda names its channel caches by hash, the url is near the top.
+            with open(file, "rb") as f:
+                if b"conda-forge" in f.read(2**10):
+                    files.append(file)
+    return files
+
+
+def conda_index(repodata=None, cache={}):
+    """the package names in the local repodata, the names of each set of files are cached on disk."""
+    files = [x for x in repodata_files(repodata) if x.exists()]
+    key = tuple((str(x), x.stat().st_mtime_ns, x.stat().st_size) for x in files)
+    if key not in cache:
+        import hashlib
+
+        index = (
+            options.cache
+            / "conda-index"
+            / f"{hashlib.sha1(repr(key).encode()).hexdigest()}.txt"
+        )
+        if index.exists():
+            names = index.read_text().split()
+        else:
+            names = set()
+            for file in files:
+                names.update(
+                    x.decode() for x in REPODATA_NAME.findall(file.read_bytes())
+                )
+            names = sorted(names)
+            if names:
+                index.parent.mkdir(parents=True, exist_ok=True)
+                index.write_text("\n".join(names) + "\n")
+        cache[key] = frozenset(names)
+    return cache[key]
+
+
+def partition_conda(packages, repodata=None):
+    """split the packages into the ones on conda and the ones for pip with the local repodata.
+
+    flags stay with conda. without repodata it returns None and the solver decides."""
+    index = conda_index(repodata)
+    if not index:
+        return None
+    conda, pip = [], []
+    for package in packages:
+        if not isinstance(package, str) or package.startswith("-"):
+            conda.append(package)
+            continue
+        name = re.split(r"[\s<>=!~;\[]", package, 1)[0].lower()
+        (conda if name in index else pip).append(package)
+    return conda, pip
+
+
 def packages_from_conda_not_found(out):
     packages = []
     if out.startswith("PackagesNotFoundError"):
@@ -6,6 +6,7 @@
 """
 
 import collections
+import contextlib
 import io
 import textwrap
 
@@ -50,35 +51,151 @@ class File(Path):
     """a supercharged file object that make it is easy to dump and load data.
 
     the loaders and dumpers edit files in-place, these constraints may not apply to all systems.
+    the codecs register their suffixes when they are defined, other packages add codecs with
+    `qpub.codecs` entry points named by suffix.
     """
 
-    def write(self, object):
-        self.write_text(self.dump(object))
+    _codecs = {}
+    _documents = {}
+    # the pending documents of the open write transaction.
+    _transaction = None
 
-    def update(self, object):
-        return self.write(merge(self.read(), object))
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for suffix in cls.__dict__.get("_suffixes", ()):
+            File._codecs.setdefault(suffix, cls)
 
-    def load(self):
-        """a permissive method to load data from files and edit documents in place."""
-        for cls in File.__subclasses__():
-            if hasattr(cls, "_suffixes"):
-                if self.suffix in cls._suffixes:
-                    return cls.load(self)
-        else:
+    def codec(self):
+        """the class that loads and dumps the suffix of the file."""
+        try:
+            return File._codecs[self.suffix]
+        except KeyError:
+            pass
+        for point in codec_entry_points():
+            if point.name not in File._codecs:
+                File._codecs[point.name] = point.load()
+        try:
+            return File._codecs[self.suffix]
+        except KeyError:
             raise TypeError(f"Can't load type with suffix: {self.suffix}")
 
+    def write(self, object):
+        key = str(self.absolute())
+        File._documents.pop((key, True), None)
+        File._documents.pop((key, False), None)
+        if File._transaction is None:
+            self.replace_text(self.dump(object))
+        else:
+            File._transaction[key] = self, object
+
+    def replace_text(self, text):
+        """write text through a temporary file and a rename, identical text is not written.
+
+        return whether the file changed, unchanged files keep their modification time."""
+        import os
+        import tempfile
+
+        data = text.encode()
+        try:
+            if self.read_bytes() == data:
+                return False
+            mode = self.stat().st_mode
+        except FileNotFoundError:
+            mode = 0o666 & ~umask()
+        # rename onto the target of a symlink, the link stays a link.
+        target = Path(os.path.realpath(self))
+        fd, name = tempfile.mkstemp(
+            prefix=f".{target.name}.", suffix=".tmp", dir=target.parent
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.chmod(name, mode & 0o7777)
+            os.replace(name, target)
+        except BaseException:
+            os.unlink(name)
+            raise
+        return True
+
+    def update(self, object, strategies=None):
+        return self.write(merge(self.read(), object, strategies=strategies))
+
+    def load(self, edit=True):
+        """a permissive method to load data from files and edit documents in place.
+
+        edit=False reads plain data with the fastest parser, the documents cannot be dumped in place.
+        each version of a file is parsed once, the callers get their own copy of the document."""
+        import copy
+
+        codec, key = self.codec(), str(self.absolute())
+        if File._transaction and key in File._transaction:
+            return copy.deepcopy(File._transaction[key][1])
+        load = codec.load if edit else getattr(codec, "load_fast", codec.load)
+        try:
+            stat = self.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return load(self)
+        # atomic writes replace the inode, it tells apart edits within one mtime tick.
+        stamp = stat.st_mtime_ns, stat.st_size, stat.st_ino
+        if File._documents.get((key, edit), (None,))[0] != stamp:
+            File._documents[key, edit] = stamp, load(self)
+        return copy.deepcopy(File._documents[key, edit][1])
+
     def dump(self, object):
         """a permissive method to dump data from files and edit documents in place."""
-        for cls in File.__subclasses__():
-            if hasattr(cls, "_suffixes"):
-                if self.suffix in cls._suffixes:
-                    return cls.dump(self, object)
-        else:
-            raise TypeError(f"Can't dump type with suffix: {self.suffix}")
+        return self.codec().dump(self, object)
 
     __add__, read = update, load
 
 
+@contextlib.contextmanager
+def transaction():
+    """buffer the files written in the block and write each one once when it exits.
+
+    loads in the block see the pending documents, an exception discards them.
+    nested transactions join the outer one."""
+    if File._transaction is not None:
+        yield File._transaction
+        return
+    File._transaction = pending = {}
+    try:
+        yield pending
+        flush()
+    finally:
+        File._transaction = None
+
+
+def flush():
+    """write the pending documents of the open transaction now.
+
+    actions flush before they run commands that read or write the files."""
+    pending = File._transaction or {}
+    while pending:
+        file, object = pending.pop(next(iter(pending)))
+        file.replace_text(file.dump(object))
+
+
+def umask(cache=[]):
+    """the umask of the process, new files get the permissions open would give them."""
+    import os
+
+    if not cache:
+        cache.append(os.umask(0))
+        os.umask(cache[0])
+    return cache[0]
+
+
+def codec_entry_points(cache=[]):
+    """the entry points in the `qpub.codecs` group, they are looked up once."""
+    if not cache:
+        points = importlib.metadata.entry_points()
+        if hasattr(points, "select"):
+            cache.append(list(points.select(group="qpub.codecs")))
+        else:
+            cache.append(list(points.get("qpub.codecs", [])))
+    return cache[0]
+
+
 class Convention(File):
     """a convention indicates explicit or implicit filename and directory conventions.
 
@@ -216,6 +333,18 @@ def load_toml(str):
     return tomlkit.parse(str)
 
 
+def read_toml(str):
+    """parse toml into plain data with tomllib or tomli, tomlkit is the fallback."""
+    try:
+        import tomllib
+    except ModuleNotFoundError:
+        try:
+            import tomli as tomllib
+        except ModuleNotFoundError:
+            return to_dict(load_toml(str))
+    return tomllib.loads(str)
+
+
 @ensure_trailing_eol
 def dump_toml(object):
     import tomlkit
@@ -230,6 +359,13 @@ def load_yaml(str):
     return object.load(str)
 
 
+def read_yaml(str):
+    """parse yaml into plain data, the safe loader uses libyaml when ruamel was built with it."""
+    import ruamel.yaml
+
+    return ruamel.yaml.YAML(typ="safe").load(str)
+
+
 @ensure_trailing_eol
 def dump_yaml(object):
     import ruamel.yaml
@@ -291,6 +427,12 @@ class TOML(File):
         except FileNotFoundError:
             return load_toml("")
 
+    def load_fast(self):
+        try:
+            return read_toml(self.read_text())
+        except FileNotFoundError:
+            return {}
+
     def dump(self, object):
         return dump_toml(object)
 
@@ -303,7 +445,7 @@ class JSON(File):
 
         return json.loads(self.read_text())
 
-    def dump(self, boject):
+    def dump(self, object):
         import json
 
         return json.dumps(object)
@@ -320,39 +462,95 @@ class YML(File):
         except FileNotFoundError:
             return load_yaml("{}")
 
+    def load_fast(self):
+        try:
+            return read_yaml(self.read_text())
+        except FileNotFoundError:
+            return {}
+
     def dump(self, object):
         return dump_yaml(object)
 
 
-def merge(*args):
-    import functools
+STRATEGIES = "append", "keep", "replace", "union"
+
 
+def merge(*args, strategies=None):
+    """merge the documents into the first one.
+
+    mappings merge by key, lists and tuples gain the items they lack, sets become sorted lists,
+    and other values keep the first truthy value.
+    strategies map dotted key paths to append, keep, replace, or union to change how a key merges."""
     if not args:
         return {}
-    if len(args) == 1:
-        return args[0]
-    a, b, *args = args
-    if args:
-        b = functools.reduce(merge, (b, *args))
+    return merge_objects(list(args), strategies or {})
+
+
+def merge_objects(objects, strategies, path=""):
+    """merge all the objects at a key path at once, the lists share one index of their items."""
+    a, *rest = objects
+    if not rest:
+        return a
+    strategy = strategies.get(path, "union")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown merge strategy {strategy} for {path}")
+    if strategy == "replace":
+        return objects[-1]
+    if strategy == "keep":
+        return next((x for x in objects if x is not None), None)
     if hasattr(a, "items"):
-        for k, v in a.items():
-            if k in b:
-                a[k] = merge(v, b[k])
-        for k, v in b.items():
-            if k not in a:
-                try:
-                    a[k] = v
-                except ValueError as exception:
-                    if hasattr(a, "add_section"):
-                        a.add_section(k)
-                        a[k].update(v)
-                    else:
-                        raise exception
+        if not all(hasattr(x, "items") for x in rest):
+            return merge_objects(
+                [a, merge_objects(rest, strategies, path)], strategies, path
+            )
+        values = {}
+        for object in rest:
+            for k, v in object.items():
+                values.setdefault(k, []).append(v)
+        for k, v in values.items():
+            key = f"{path}.{k}" if path else str(k)
+            if k in a:
+                a[k] = merge_objects([a[k], *v], strategies, key)
+                continue
+            v = merge_objects(v, strategies, key)
+            try:
+                a[k] = v
+            except ValueError as exception:
+                if hasattr(a, "add_section"):
+                    a.add_section(k)
+                    a[k].update(v)
+                else:
+                    raise exception
         return a
-    if isinstance(a, tuple):
-        return a + tuple(x for x in b if x not in a)
-    if isinstance(a, list):
-        return a + list(x for x in b if x not in a)
+    if isinstance(a, (tuple, list)):
+        if strategy == "append":
+            missing = (x for object in rest for x in object)
+        else:
+            missing = missing_items(a, rest)
+        return a + (tuple if isinstance(a, tuple) else list)(missing)
     if isinstance(a, set):
-        return list(sorted(set(a).union(b)))
-    return a or b
+        return list(sorted(set(a).union(*rest)))
+    return next((x for x in objects if x), objects[-1])
+
+
+def missing_items(a, objects):
+    """the items of the objects that are not in a yet.
+
+    hashable items are found in a set, unhashable items by equality."""
+    hashable, unhashable = set(), []
+    for x in a:
+        try:
+            hashable.add(x)
+        except TypeError:
+            unhashable.append(x)
+    for object in objects:
+        for x in object:
+            try:
+                if x in hashable:
+                    continue
+                hashable.add(x)
+            except TypeError:
+                if x in unhashable:
+                    continue
+                unhashable.append(x)
+            yield x
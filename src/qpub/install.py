@@ -44,7 +44,7 @@ def task_conda():
 
     def conda(mamba, channel):
         backend = mamba and "mamba" or "conda"
-        data = ENVIRONMENT_YAML.load()
+        data = ENVIRONMENT_YAML.load(edit=False)
         deps = data.get("dependencies", [])
         pip = []
         for dep in deps:
@@ -168,7 +168,7 @@ def task_develop():
 
 def build_backend():
     return (
-        PYPROJECT_TOML.load()
+        PYPROJECT_TOML.load(edit=False)
         .get(BUILDSYSTEM, {})
         .get("build-backend", None)
         .partition(".")[0]
@@ -24,7 +24,14 @@ def run_in_nox():
 
 
 try:
-    from .dodo import ENVIRONMENT_YAML, PYPROJECT_TOML, File, Project, options
+    from .dodo import (
+        ENVIRONMENT_YAML,
+        PYPROJECT_TOML,
+        File,
+        Project,
+        options,
+        partition_conda,
+    )
 except ImportError as e:
     # when we invoke this file from nox it cannot naturally import files. this block loads the task file from teh specification.
     if run_in_nox():
@@ -37,7 +44,7 @@ except ImportError as e:
         locals().update(
             {
                 k: getattr(dodo, k)
-                for k in """options File PYPROJECT_TOML Project ENVIRONMENT_YAML""".split()
+                for k in """options File PYPROJECT_TOML Project ENVIRONMENT_YAML partition_conda""".split()
             }
         )
     else:
@@ -84,7 +91,13 @@ def session_install(session, *args, **kwargs):
     pip = [x for x in args if x.startswith(".")]
     args = [x for x in args if x not in pip]
 
-    if conda:
+    split = (mamba or conda) and partition_conda(args)
+    if split:
+        # the local repodata splits the packages before any solve.
+        args, pip = split[0], pip + split[1]
+        if [x for x in args if not x.startswith("-")]:
+            session.conda_install(*args, **kwargs)
+    elif conda:
         _run = type(session).run
 
         type(session).run = run
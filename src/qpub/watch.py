@@ -0,0 +1,254 @@
+"""watch the project with inotify and rerun the tasks whose inputs changed.
+
+`qpub watch` keeps an inventory of the project in memory and applies the file events to it.
+a task reruns when one of its file dependencies changed,
+the table of contents reruns when files are added or removed,
+and the requirements rerun when the imports of a file changed.
+"""
+
+import ctypes
+import ctypes.util
+import dataclasses
+import hashlib
+import os
+import re
+import select
+import struct
+import sys
+
+from . import Chapter, Path, get_chapter, ignored_in, invalidate, main, walk
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+
+import_pattern = re.compile(r"""^[\s"']*((?:from|import)\s[^\n"'\\]*)""", re.MULTILINE)
+
+
+@dataclasses.dataclass
+class Inotify:
+    """a minimal ctypes binding to the linux inotify api."""
+
+    fd: int = None
+    watches: dict = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on linux.")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, dir):
+        """watch the entries of a directory."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir), MASK)
+        if wd >= 0:
+            self.watches[wd] = str(dir)
+
+    def read(self, timeout=None):
+        """return the mask and path of the pending events, wait for timeout seconds."""
+        events = []
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return events
+        data, offset = os.read(self.fd, 2**16), 0
+        while offset < len(data):
+            wd, mask, cookie, size = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16 : offset + 16 + size].rstrip(b"\0")
+            offset += 16 + size
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            elif wd in self.watches:
+                path = os.path.join(self.watches[wd], os.fsdecode(name))
+                events.append((mask, os.path.normpath(path)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def fingerprint(file):
+    """hash the import statements of a file, other edits leave the fingerprint alone."""
+    if Path(file).suffix not in {".py", ".ipynb", ".md", ".rst"}:
+        return None
+    try:
+        source = Path(file).read_text()
+    except (OSError, UnicodeDecodeError):
+        return None
+    imports = sorted(set(x.strip() for x in import_pattern.findall(source)))
+    if imports:
+        return hashlib.sha1("\n".join(imports).encode()).hexdigest()
+
+
+@dataclasses.dataclass
+class Watch:
+    """the in memory inventory of the project that the file events are applied to."""
+
+    tasks: dict
+    dir: object = dataclasses.field(default_factory=Path)
+    files: dict = dataclasses.field(default_factory=dict, repr=False)
+    entries: dict = dataclasses.field(default_factory=dict, repr=False)
+    inotify: object = dataclasses.field(default=None, repr=False)
+    tasks_dependencies: dict = dataclasses.field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.dir = Path(self.dir)
+        if self.inotify is None:
+            self.inotify = Inotify()
+        self.add_directory(self.dir)
+
+    def add_directory(self, dir):
+        self.inotify.add(dir)
+        start = os.path.relpath(dir, self.dir)
+        for x, is_dir, by in walk(self.dir, start="" if start == os.curdir else start):
+            self.entries[str(x)] = is_dir, by
+            if by:
+                continue
+            if is_dir:
+                self.inotify.add(x)
+            else:
+                self.files[str(x)] = fingerprint(x)
+
+    def apply(self, events):
+        """apply file events to the inventory.
+
+        return the changed paths, whether files were added or removed, and whether imports changed."""
+        changed, structure, imports = set(), False, False
+        for mask, path in events:
+            changed.add(path)
+            by = self.ignored(mask, path)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.entries[path] = bool(mask & IN_ISDIR), by
+            elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF):
+                prefix = path + os.sep
+                for x in [x for x in self.entries if x == path or x.startswith(prefix)]:
+                    del self.entries[x]
+            if by:
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                structure = True
+                if mask & IN_ISDIR:
+                    self.add_directory(Path(path))
+                else:
+                    self.files[path] = fingerprint(path)
+                    imports = imports or self.files[path] is not None
+            elif mask & (IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF):
+                for file in [
+                    x for x in self.files if x == path or x.startswith(prefix)
+                ]:
+                    structure = True
+                    imports = imports or self.files.pop(file) is not None
+            elif mask & IN_CLOSE_WRITE and path in self.files:
+                previous, self.files[path] = self.files[path], fingerprint(path)
+                imports = imports or previous != self.files[path]
+        return changed, structure, imports
+
+    def ignored(self, mask, path):
+        """the pattern that ignores the path of an event, the .gitignore files apply like in walk."""
+        return ignored_in(os.path.relpath(path, self.dir), mask & IN_ISDIR, self.dir)
+
+    def chapter(self):
+        """the chapter of the inventory, the project is not walked again."""
+        return Chapter(
+            self.dir,
+            entries=[(Path(x), is_dir, by) for x, (is_dir, by) in self.entries.items()],
+        )
+
+    def dependencies(self, structure=False):
+        """the normalized file dependencies and targets of each task.
+
+        the task creators only run again when files were added or removed."""
+        if self.tasks_dependencies is not None and not structure:
+            return self.tasks_dependencies
+        object = {}
+        for name, callable in self.tasks.items():
+            if not name.startswith("task_"):
+                continue
+            task = callable()
+            object[name[len("task_") :]] = (
+                set(os.path.normpath(str(x)) for x in task.get("file_dep", [])),
+                set(os.path.normpath(str(x)) for x in task.get("targets", [])),
+            )
+        self.tasks_dependencies = object
+        return object
+
+    def plan(self, changed, structure=False, imports=False):
+        """list the tasks to rerun for the changes, dependent tasks follow their dependencies."""
+        # tasks with missing file dependencies cannot run yet.
+        dependencies = {
+            k: v
+            for k, v in self.dependencies(structure).items()
+            if all(map(os.path.exists, v[0]))
+        }
+        names = set(
+            x for x, (file_dep, _) in dependencies.items() if file_dep & changed
+        )
+        if structure:
+            names.add("toc")
+        if imports:
+            names.add("requirements_txt")
+        names &= set(dependencies)
+        next = names
+        while next:
+            targets = set().union(*(dependencies[x][1] for x in next))
+            next = set(
+                x for x, (file_dep, _) in dependencies.items() if file_dep & targets
+            )
+            next -= names
+            names |= next
+        return [x for x in dependencies if x in names], set().union(
+            *(dependencies[x][1] for x in names)
+        )
+
+    def run(self, debounce=0.05):
+        """wait for events, apply them, and rerun the tasks they touch until interrupted."""
+        ignore = set()
+        while True:
+            events = self.inotify.read()
+            while True:
+                more = self.inotify.read(debounce)
+                if not more:
+                    break
+                events += more
+            # skip the events from the targets the last run wrote.
+            events = [(mask, path) for mask, path in events if path not in ignore]
+            ignore = set()
+            changed, structure, imports = self.apply(events)
+            # changes to ignored files, like the doit database, never touch a task.
+            if all(self.ignored(mask, path) for mask, path in events):
+                continue
+            invalidate()
+            get_chapter.seed(self.chapter())
+            names, ignore = self.plan(changed, structure, imports)
+            if names:
+                print(f"""qpub watch: {" ".join(names)}""")
+                main(self.tasks, argv=names)
+
+
+def watch(tasks):
+    """watch the working directory and rerun tasks as the project changes."""
+    try:
+        object = Watch(tasks)
+    except OSError as exception:
+        raise SystemExit(
+            f"qpub watch needs inotify, try `doit auto` instead. {exception}"
+        )
+    try:
+        object.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        object.inotify.close()
@@ -216,3 +216,519 @@ def test_flit_projects(pytester, layout):
 
     # configure linter files
     run(pytester, "qpub precommit")
+
+
+# %% [markdown]
+# the ignore patterns are compiled into a single matcher; it reports the same pattern as checking each pattern in order.
+
+# %%
+@pytest.mark.parametrize("path", [
+    "my_idea/__init__.py", "my_idea/__pycache__/x.pyc", "x.pyc", "build", "build/x",
+    "docs/_build/html", "a/.ipynb_checkpoints/b", "my_idea.egg-info/PKG-INFO",
+    ".doit.db.bak", "site", "a/site", "share/python-wheels/x", "foo$py.class"
+])
+def test_ignored_by(path):
+    import qpub
+    expected = next((k for k, v in qpub.ignore().items() if v.regex.match(path)), None)
+    assert qpub.ignored_by(path) == expected
+
+
+# %% [markdown]
+# the table of contents lists every directory once, under its nearest listed parent.
+
+# %%
+def test_toc(pytester, monkeypatch, tmp_path):
+    import qpub
+    from qpub import configure
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, {"readme.md": "# r", "docs": {"index.md": "# i", "api": {"a.md": "# a"}},
+                     "posts": {"blog.md": "# b", "2020": {"post.md": "# p"}}})
+    assert configure.get_section(qpub.Chapter()) == dict(file="readme", sections=[
+        dict(file="docs/index", sections=[dict(file="docs/api/a", sections=[])]),
+        dict(file="posts/blog", sections=[dict(file="posts/2020/post", sections=[])]),
+    ])
+
+
+# %% [markdown]
+# the directory listings are saved in an inventory; a second walk replays the listings of directories that did not change.
+
+# %%
+def test_inventory(pytester, tmp_path, monkeypatch):
+    import qpub
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, flit_layouts[1])
+    inventory = qpub.Inventory()
+    file = inventory.file
+    assert file.parent == tmp_path / "inventory"
+    first = list(qpub.walk(inventory=inventory))
+    inventory.save()
+    
+    inventory = qpub.Inventory(file=file)
+    assert list(qpub.walk(inventory=inventory)) == first
+    assert not inventory.changed
+    
+    (pytester.path / "my_idea" / "extra.py").write_text("")
+    inventory = qpub.Inventory(file=file)
+    assert qpub.Path("my_idea/extra.py") in [x for x, *_ in qpub.walk(inventory=inventory)]
+    assert inventory.changed
+
+
+# %% [markdown]
+# the project is scanned once per run; tasks that write targets invalidate the snapshot.
+
+# %%
+def test_snapshot(pytester, monkeypatch, tmp_path):
+    import qpub
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, flit_layouts[1])
+    chapter = qpub.get_chapter()
+    assert qpub.get_chapter() is chapter
+    assert qpub.Task(actions=[print], targets=["x"])["actions"][-1] is qpub.invalidate
+    qpub.invalidate()
+    assert qpub.get_chapter() is not chapter
+
+
+# %% [markdown]
+# the `.gitignore` files in the project prune the walk below their directory.
+
+# %%
+def test_nested_gitignore(pytester, monkeypatch, tmp_path):
+    import qpub
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, dict(my_idea={
+        "__init__.py": meta+contents, ".gitignore": "data/\n*.csv\n!keep.csv\n",
+        "data": {"dump.py": ""}, "table.csv": "", "keep.csv": ""
+    }))
+    chapter = qpub.Chapter()
+    assert qpub.Path("my_idea/__init__.py") in chapter.include
+    assert qpub.Path("my_idea/keep.csv") in chapter.include
+    assert qpub.Path("my_idea/table.csv") in chapter.exclude
+    assert qpub.Path("my_idea/data") in chapter.exclude_directories
+    assert qpub.Path("my_idea/data/dump.py") not in chapter.exclude
+    # the last pattern that matches decides, like git.
+    (pytester.path / "my_idea" / ".gitignore").write_text("!keep.csv\n*.csv\n")
+    assert qpub.Path("my_idea/keep.csv") in qpub.Chapter().exclude
+    assert sorted(qpub.walk()) == sorted(qpub.walk(jobs=4))
+
+
+# %% [markdown]
+# `qpub watch` applies inotify events to its inventory and plans the configuration tasks to rerun.
+
+# %%
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is linux only")
+def test_watch_plan(pytester, monkeypatch, tmp_path):
+    import qpub
+    from qpub import __main__, watch
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, flit_layouts[1])
+    object = watch.Watch(__main__.load_tasks("configure"))
+    try:
+        (pytester.path / "my_idea" / "page.md").write_text("# a page")
+        changed, structure, imports = object.apply(object.inotify.read(1))
+        assert structure and not imports
+        assert object.plan(changed, structure, imports)[0] == ["toc"]
+
+        (pytester.path / "my_idea" / "__init__.py").write_text(meta + "import numpy")
+        changed, structure, imports = object.apply(object.inotify.read(1))
+        assert imports and not structure
+        # content changes reuse the task dependencies.
+        dependencies = object.tasks_dependencies
+        assert "requirements_txt" in object.plan(changed, structure, imports)[0]
+        assert object.tasks_dependencies is dependencies
+
+        # the inventory stands in for a walk of the project.
+        assert object.chapter().dump() == qpub.Chapter().dump()
+
+        # the .gitignore files of the project apply to the entries created while watching.
+        (pytester.path / ".gitignore").write_text("scratch/\n*.log\n")
+        object.apply(object.inotify.read(1))
+        (pytester.path / "scratch").mkdir()
+        (pytester.path / "scratch" / "big.py").write_text("import numpy")
+        (pytester.path / "my_idea" / "run.log").write_text("")
+        assert object.apply(object.inotify.read(1))[1:] == (False, False)
+        assert "scratch" not in object.inotify.watches.values()
+        assert object.chapter().dump() == qpub.Chapter().dump()
+
+        # ignored files never plan a task.
+        (pytester.path / ".doit.db").write_text("")
+        events = object.inotify.read(1)
+        assert events and all(qpub.ignored(path) for _, path in events)
+        assert object.apply(events)[1:] == (False, False)
+    finally:
+        object.inotify.close()
+
+
+# %% [markdown]
+# the inferred imports are cached by the contents of the files, unchanged files skip `depfinder`.
+
+# %%
+def test_import_cache(pytester, monkeypatch, tmp_path):
+    import qpub
+    from qpub import configure
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, flit_layouts[1])
+    files = [qpub.Path("my_idea/__init__.py")]
+    assert configure.merged_imports(files) == ["pandas"]
+    # the cache answers without depfinder.
+    monkeypatch.setattr(configure, "_import_depfinder", None)
+    assert configure.merged_imports(files) == ["pandas"]
+
+
+# %% [markdown]
+# the imports are inferred as the files stream in, progress hears about every finished file.
+
+# %%
+def test_import_progress(pytester, monkeypatch, tmp_path):
+    import qpub
+    from qpub import configure
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, flit_layouts[1])
+    progress = []
+    assert configure.run_coroutine(configure.merge_imports(
+        [qpub.Path("my_idea/__init__.py"), qpub.Path("my_idea")],
+        progress=lambda *x: progress.append(x))) == ["pandas"]
+    assert progress == [(1, 2), (2, 2)]
+
+
+# %% [markdown]
+# large batches of files are parsed in a process pool.
+
+# %%
+def test_import_pool(pytester, monkeypatch, tmp_path):
+    import importlib, qpub
+    # pytester restores sys.modules, the worker processes pickle functions by their module.
+    configure = importlib.import_module("qpub.configure")
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    modules = [pytester.path / f"module_{i}.py" for i in range(40)]
+    for i, file in enumerate(modules):
+        file.write_text(f"import numpy\nimport pkg{i}")
+    payloads = configure.gather_imports(modules, 2)
+    assert [sorted(payloads[x]["required"]) for x in modules] == [
+        ["numpy", f"pkg{i}"] for i in range(40)]
+
+
+# %% [markdown]
+# the chunks are capped by files and bytes, the sources in flight do not grow with the project.
+
+# %%
+def test_import_chunks(pytester, monkeypatch, tmp_path):
+    import qpub
+    from qpub import configure
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    monkeypatch.setattr(qpub.options, "imports", "ast")
+    # without a budget the chunks are parsed in a thread that sees the patched functions.
+    monkeypatch.setattr(qpub.options, "file_budget", 0)
+    modules = [pytester.path / f"module_{i}.py" for i in range(40)]
+    for i, file in enumerate(modules):
+        file.write_text(f"import pkg{i}")
+    chunks, parse_chunk = [], configure.parse_chunk
+    monkeypatch.setattr(configure, "parse_chunk", lambda x, *y: chunks.append(len(x)) or parse_chunk(x, *y))
+    monkeypatch.setattr(configure, "CHUNK_FILES", 4)
+    assert len(configure.gather_imports(modules[:20], 1)) == 20
+    assert chunks == [4] * 5
+    chunks.clear()
+    monkeypatch.setattr(configure, "CHUNK_BYTES", 1)
+    assert len(configure.gather_imports(modules[20:], 1)) == 20
+    assert chunks == [1] * 20
+
+
+# %% [markdown]
+# the source, test, and docs imports are inferred in one pass, a file in many partitions is read once.
+
+# %%
+def test_partitioned_imports(pytester, monkeypatch, tmp_path):
+    import qpub
+    from qpub import configure
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    build(pytester, flit_layouts[1])
+    files = [qpub.Path("my_idea/__init__.py")]
+    reads = []
+    monkeypatch.setattr(configure, "read", lambda x, read=configure.read: reads.append(x) or read(x))
+    assert configure.partitioned_imports(dict(source=files, test=files, docs=[])) == dict(
+        source=["pandas"], test=["pandas"], docs=[])
+    assert reads == files
+
+
+# %% [markdown]
+# the builtin `ast` scanner finds the same imports as `depfinder`, select it with `QPUB_IMPORTS=ast`.
+
+# %%
+def test_scan_imports():
+    from qpub import configure
+    source = """import os, numpy.linalg\nfrom . import x\ntry:\n    import scipy
+except ImportError:\n    pass\ndef f():\n    import requests\nclass A:\n    import yaml
+importlib.import_module("toml")"""
+    assert configure.scan_imports(source) == dict(
+        builtin={"os"}, required={"numpy", "yaml"}, questionable={"scipy", "requests", "toml"})
+
+
+# %% [markdown]
+# the import, pypi, and conda names are translated with a bundled table that is binary searched without `depfinder`.
+
+# %%
+def test_mapping(tmp_path, monkeypatch):
+    from qpub import configure
+    assert configure.import_to_pypi(["yaml", "numpy"]) == ["PyYAML", "numpy"]
+    table = configure.Mapping.write([
+        dict(import_name=x, pypi_name=f"{x}-py", conda_name=f"{x}-conda") for x in "cab"
+    ] + [dict(import_name="a", pypi_name="other", conda_name="other")], tmp_path / "mapping.tsv")
+    assert [table.get("import", x) for x in "abcd"] == ["a-py", "b-py", "c-py", None]
+    assert table.get("pypi", "b-py") == "b-conda"
+    # an updated mapping in the cache is opened once it is forgotten.
+    monkeypatch.setattr(configure.options, "cache", tmp_path)
+    configure.forget_mapping()
+    assert configure.mapping() is configure.mapping() and configure.mapping().file == tmp_path / "mapping.tsv"
+    configure.forget_mapping()
+
+
+# %% [markdown]
+# the code in notebooks is scanned from the text without decoding the outputs.
+
+# %%
+def test_rough_source():
+    import contextlib, json, nbformat
+    from qpub import configure
+    cell = nbformat.v4.new_code_cell('import pandas\nprint("\\\\\\"]}")')
+    cell.outputs = [nbformat.v4.new_output("stream", text='"[{\\')]
+    text = nbformat.writes(nbformat.v4.new_notebook(cells=[
+        nbformat.v4.new_markdown_cell("import numpy"), cell, nbformat.v4.new_code_cell("  import scipy")]))
+    assert configure.rough_source(text.encode()) == configure.rough_source(json.loads(text))
+    assert configure.rough_source(text.encode()) == 'import pandas\nprint("\\\\\\"]}")\nimport scipy'
+    # truncated notebooks raise like json does instead of scanning forever.
+    with pytest.raises(ValueError):
+        configure.rough_source(b'{"cells": [{"cell_type": "code", "source": "import x", "outputs": [{"text": "abc')
+    for i in range(len(text)):
+        with contextlib.suppress(ValueError):
+            configure.rough_source(text[:i].encode())
+
+
+# %% [markdown]
+# imports are inferred from a running event loop, like a jupyter kernel, without patching it.
+
+# %%
+def test_gather_imports_async(pytester):
+    import asyncio, qpub
+    build(pytester, flit_layouts[1])
+    files = [qpub.Path("my_idea/__init__.py")]
+
+    async def main():
+        ticks = []
+        async def tick():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+        ticker = asyncio.ensure_future(tick())
+        payload = await qpub.gather_imports_async(files, jobs=1)
+        ticker.cancel()
+        from qpub import configure
+        assert configure.gather_imports(files) == payload
+        return payload, ticks
+
+    payload, ticks = asyncio.run(main())
+    assert payload[files[0]]["required"] == {"pandas"} and ticks
+    assert "nest_asyncio" not in sys.modules
+
+
+# %% [markdown]
+# notebooks are inferred cell by cell, editing a cell only parses that cell again.
+
+# %%
+def test_notebook_cells(pytester, monkeypatch, tmp_path):
+    import nbformat, qpub
+    from qpub import configure
+    monkeypatch.setattr(qpub.options, "cache", tmp_path)
+    monkeypatch.setattr(qpub.options, "file_budget", 0)
+    cells = [nbformat.v4.new_code_cell(f"import pkg{i}") for i in range(3)] + [
+        nbformat.v4.new_code_cell("!pip install pandas")]
+    file = pytester.path / "cells.ipynb"
+    file.write_text(nbformat.writes(nbformat.v4.new_notebook(cells=cells)))
+    configure.gather_imports([file], 1)
+    cells[1].source = "import numpy"
+    file.write_text(nbformat.writes(nbformat.v4.new_notebook(cells=cells)))
+    parsed = []
+    monkeypatch.setattr(configure, "parse", lambda *x, **y: parsed.append(x[1]) or {"required": {"numpy"}})
+    assert configure.gather_imports([file], 1)[file]["required"] == {"pkg0", "numpy", "pkg2"}
+    assert parsed == [b"import numpy"]
+    # notebooks larger than the sampling limit are still split, their outputs are never parsed.
+    monkeypatch.setattr(qpub.options, "max_bytes", 10)
+    assert len(configure.notebook_cells(file.read_bytes())) == 4
+    # truncated and huge notebooks are not split on the event loop, they are parsed whole.
+    assert configure.notebook_cells(file.read_bytes()[:-60]) == []
+    monkeypatch.setattr(qpub.options, "max_notebook", 10)
+    assert configure.notebook_cells(file.read_bytes()) == []
+    assert configure.gather_imports([file], 1)[file] and parsed[-1] == file.read_bytes()
+
+
+# %% [markdown]
+# large, generated, and minified files are sampled for their imports instead of parsed, the requirements report them.
+
+# %%
+def test_sampled_imports(pytester):
+    import qpub
+    from qpub import configure
+    pytester.makepyfile(stub_pb2="# Generated by the protocol buffer compiler.  DO NOT EDIT!\n"
+                        "import sys\nfrom google.protobuf import descriptor\nfrom . import x\n")
+    report = {}
+    assert configure.partitioned_imports(dict(source=["stub_pb2.py"]), report) == dict(source=["google"])
+    assert report == {qpub.Path("stub_pb2.py"): ["generated"]}
+    assert configure.parse(".py", b"import a\n" + b"x" * qpub.options.max_line)["sampled"] == {"long lines"}
+    # only marker comments in the header count, a docstring that mentions generated files does not.
+    assert configure.sampled(b'"""Helpers for figures generated by matplotlib."""\ntry:\n    import scipy\nexcept ImportError:\n    pass\n') is None
+    assert configure.sampled(b"#!/usr/bin/env python\n\n# @generated\nimport a\n") == "generated"
+    # a single slow file is parsed in a worker process, the budget interrupts it.
+    pytester.makepyfile(slow="import numpy\n" + "x = 1\n" * 10**5)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(qpub.options, "file_budget", 1e-6)
+        monkeypatch.setattr(qpub.options, "imports", "ast")
+        payload = configure.gather_imports([pytester.path / "slow.py"], 1)[pytester.path / "slow.py"]
+    assert payload == dict(required={"numpy"}, sampled={"timeout"})
+    # timeouts depend on the machine and are never cached.
+    cache = configure.import_cache(pytester.path / "imports.sqlite")
+    configure.store(cache, "key", {"sampled": {"timeout"}, "required": {"a"}})
+    assert configure.cached(cache, "key") is None
+
+
+# %% [markdown]
+# the local repodata splits the conda and pip packages without a solve.
+
+# %%
+def test_partition_conda(tmp_path, monkeypatch):
+    from qpub import dodo
+    monkeypatch.setattr(dodo.options, "cache", tmp_path)
+    repodata = tmp_path / "noarch" / "repodata.json"
+    repodata.parent.mkdir()
+    repodata.write_text('{"packages": {"numpy-1.0.tar.bz2": {"name": "numpy"}, "pip-1.0.tar.bz2": {"name": "pip"}}}')
+    assert dodo.partition_conda(["-cconda-forge", "NumPy>=1", "pip", "qpub"], tmp_path) == (
+        ["-cconda-forge", "NumPy>=1", "pip"], ["qpub"])
+    assert list((tmp_path / "conda-index").glob("*.txt"))
+    # without an active environment a pkgs directory in the project is not a conda cache.
+    for x in ("CONDA_PREFIX", "CONDA_PKGS_DIRS"):
+        monkeypatch.delenv(x, raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "pkgs" / "cache").mkdir(parents=True)
+    (tmp_path / "pkgs" / "cache" / "channel.json").write_text('{"_url": "conda-forge"}')
+    assert dodo.repodata_files() == []
+
+
+# %% [markdown]
+# the `dodo` chapters only see the files git tracks, nested chapters share the inventory of the root.
+
+# %%
+def test_dodo_inventory(pytester):
+    import git
+    from qpub import dodo
+    build(pytester, dict(my_idea={"__init__.py": "", "tracked.py": "", "untracked.py": ""}))
+    repo = git.Repo.init(pytester.path)
+    repo.index.add(["my_idea/__init__.py", "my_idea/tracked.py"])
+    chapter, = dodo.Chapter(dir=pytester.path)._chapters
+    assert chapter.dir.name == "my_idea"
+    assert [x.name for x in chapter.modules] == ["__init__.py", "tracked.py"]
+    # a change to the git index lists the files again.
+    repo.index.add(["my_idea/untracked.py"])
+    chapter, = dodo.Chapter(dir=pytester.path)._chapters
+    assert [x.name for x in chapter.modules] == ["__init__.py", "tracked.py", "untracked.py"]
+
+
+# %% [markdown]
+# the codecs are found by suffix, each version of a file is parsed once and the callers get copies.
+
+# %%
+def test_file_codecs(pytester, monkeypatch):
+    import qpub
+    calls = []
+    load = qpub.TOML.load
+    monkeypatch.setattr(qpub.TOML, "load", lambda self: calls.append(self) or load(self))
+    file = qpub.File(pytester.path / "pyproject.toml")
+    assert file.codec() is qpub.TOML and qpub.File("a.yml").codec() is qpub.YML
+    file.write({"tool": {"qpub": {"a": 1}}})
+    file.load()["tool"]["qpub"]["a"] = 2
+    assert file.load()["tool"]["qpub"]["a"] == 1 and len(calls) == 1
+    file.update({"tool": {"qpub": {"b": 2}}})
+    assert file.load()["tool"]["qpub"]["b"] == 2 and len(calls) == 2
+    with pytest.raises(TypeError):
+        qpub.File("a.unknown").load()
+
+
+# %% [markdown]
+# a write transaction flushes each file once, unchanged files keep their modification time.
+
+# %%
+def test_transaction(pytester):
+    import qpub
+    file = qpub.File(pytester.path / "setup.cfg")
+    with qpub.transaction():
+        file.update({"metadata": {"name": "a"}})
+        file.update({"options": {"zip_safe": "False"}})
+        assert not file.exists()
+    assert file.load()["metadata"]["name"] == "a" and file.load()["options"]
+    stat = file.stat()
+    file.update({"metadata": {"name": "a"}})
+    assert file.stat().st_mtime_ns == stat.st_mtime_ns
+    with pytest.raises(ZeroDivisionError), qpub.transaction():
+        file.update({"metadata": {"name": "b"}})
+        1 / 0
+    assert file.load()["metadata"]["name"] == "a"
+    assert not list(pytester.path.glob(".*.tmp"))
+    # a flush writes the pending files for the commands an action runs, the exit leaves them alone.
+    link = qpub.File(pytester.path / "link.cfg")
+    link.symlink_to(file)
+    with qpub.transaction():
+        link.write({"metadata": {"name": "b"}})
+        qpub.flush()
+        assert file.load()["metadata"]["name"] == "b"
+        file.write_text("[metadata]\nname = c\n")
+    assert link.is_symlink() and link.load()["metadata"]["name"] == "c"
+
+
+# %% [markdown]
+# merge indexes the items of lists once, strategies change how a key merges.
+
+# %%
+def test_merge():
+    import qpub
+    repos = [{"repo": "a"}, {"repo": "b"}]
+    assert qpub.merge(dict(x=[1, 2], repos=repos[:1]), dict(x=[2, 3], repos=repos), dict(x=[3, 4])) == dict(
+        x=[1, 2, 3, 4], repos=repos)
+    assert qpub.merge(
+        dict(a=[1], b=[1], c="old", d=dict(e=1)), dict(a=[1], b=[2], c="new", d=dict(e=2)),
+        strategies={"a": "append", "b": "replace", "c": "keep", "d.e": "replace"},
+    ) == dict(a=[1, 1], b=[2], c="old", d=dict(e=2))
+    assert qpub.merge({1, 3}, {2}) == [1, 2, 3] and qpub.merge((1,), [1, 2]) == (1, 2)
+
+
+# %% [markdown]
+# reads that never write back use the fast parsers and get plain data.
+
+# %%
+def test_read_only_load(tmp_path):
+    import qpub, tomlkit
+    file = qpub.File(tmp_path / "pyproject.toml")
+    file.write_text('[build-system]\nbuild-backend = "flit_core.buildapi"  # flit\n')
+    assert type(file.load(edit=False)) is dict and isinstance(file.load(), tomlkit.TOMLDocument)
+    assert file.load(edit=False) == file.load()
+    file.update({"tool": {"a": 1}})
+    assert file.load(edit=False)["tool"] == {"a": 1} and "# flit" in file.read_text()
+    yml = qpub.File(tmp_path / "environment.yml")
+    yml.write_text("dependencies:\n- numpy\n- pip:\n  - qpub\n")
+    assert yml.load(edit=False) == {"dependencies": ["numpy", {"pip": ["qpub"]}]}
+
+
+# %% [markdown]
+# templates are parsed once and identical renders are memoized, the callers get copies.
+
+# %%
+def test_templated_file(monkeypatch):
+    import qpub
+    from qpub import base
+    loads = []
+    where_template = base.where_template
+    monkeypatch.setattr(base, "where_template", lambda x: loads.append(x) or where_template(x))
+    monkeypatch.setattr(base.load_template, "__defaults__", ({},))
+    base.prewarm_templates("flit.json")
+    data = dict(name="a", author="b", email="c", description="d", requires=["e"], url="f", license="",
+                classifiers=[], keywords=[], python_version="3.7", test_requires=[], docs_requires=[],
+                long_description=None, version="0.0.0", exclude=[])
+    qpub.templated_file("flit.json", data)["tool"]["flit"].clear()
+    assert qpub.templated_file("flit.json", data) == qpub.templated_file("flit.json", dict(data))
+    assert qpub.templated_file("flit.json", data)["tool"]["flit"] and loads == ["flit.json"]